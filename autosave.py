@@ -0,0 +1,172 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from project_db import ProjectDatabase
+
+DEBOUNCE_DELAY = 0.3  # seconds without a new change before the changes are written
+MAX_DELAY = 2.0  # changes are written at the latest this long after the first unsaved one
+RETRY_DELAY = 1.0  # a failed write is retried after this long, doubled after every further failure
+MAX_RETRY_DELAY = 30.0
+
+
+class AutosaveWorker(threading.Thread):
+    # Saves changed vehicles off the GUI thread. notify() only copies the vehicle into the queue,
+    # a burst of changes is written at once after DEBOUNCE_DELAY of quiet (at most MAX_DELAY after
+    # the first one): one fsynced append to the change journal, which is merged into the output by
+    # temp file + rename, and the changed columns in the .pconf.db project if one is open.
+    def __init__(self, journal, delay=DEBOUNCE_DELAY, max_delay=MAX_DELAY):
+        super().__init__(daemon=True)
+        self.journal = journal
+        self.delay = delay
+        self.max_delay = max_delay
+        self.condition = threading.Condition()
+        self.pending = {}  # {id: (data, {column: value})}
+        self.first_change = None
+        self.last_change = None
+        self.writing = False
+        self.flushing = False
+        self.stopped = False
+        self.retry_delay = 0.0
+        self.retry_at = None
+
+        # SQLite connection can only be used by the thread that opened it, the worker opens its own
+        self.project_path = None
+        self.project = None
+
+        self.saves = 0
+        self.saved_vehicles = 0
+        self.latencies = deque(maxlen=100)  # seconds from the first change of a batch to being on disk
+        self.write_times = deque(maxlen=100)
+        self.failures = 0
+        self.last_error = None
+
+    def set_project(self, project_path):
+        # path of a .pconf.db project to update, None for text projects
+        with self.condition:
+            self.project_path = project_path
+
+    def notify(self, id, data, **columns):
+        # called from the GUI thread after vehicles[id] changed, columns are the changed project columns
+        now = time.perf_counter()
+        with self.condition:
+            previous = self.pending.get(id)
+            if previous is not None:
+                columns = {**previous[1], **columns}
+            self.pending[id] = (list(data), columns)
+            if self.first_change is None:
+                self.first_change = now
+            self.last_change = now
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+                # debounce, on flush or stop everything pending is written right away
+                while not self.stopped and not self.flushing:
+                    due = min(self.last_change + self.delay, self.first_change + self.max_delay)
+                    if self.retry_at is not None:
+                        due = max(due, self.retry_at)
+                    remaining = due - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch, self.pending = self.pending, {}
+                self.flushing = False
+                first_change, self.first_change = self.first_change, None
+                project_path = self.project_path
+                self.writing = True
+            error = None
+            try:
+                error = self.write(batch, first_change, project_path)
+            finally:
+                with self.condition:
+                    self.writing = False
+                    if error is not None:
+                        self.requeue(batch, first_change, error)
+                    self.condition.notify_all()
+            if error is not None and self.stopped:
+                print(f"Autosave stopped, {len(self.pending)} vehicles not saved")
+                break
+        if self.project is not None:
+            self.project.close()
+
+    def write(self, batch, first_change, project_path):
+        started = time.perf_counter()
+        try:
+            self.journal.append_many([(id, data) for id, (data, _) in batch.items()])
+            if project_path != (self.project.path if self.project is not None else None):
+                if self.project is not None:
+                    self.project.close()
+                self.project = ProjectDatabase(project_path) if project_path else None
+            if self.project is not None:
+                for id, (_, columns) in batch.items():
+                    self.project.update_vehicle(id, **columns)
+        except (OSError, sqlite3.Error) as e:
+            return e
+        finished = time.perf_counter()
+        self.saves += 1
+        self.saved_vehicles += len(batch)
+        self.latencies.append(finished - first_change)
+        self.write_times.append(finished - started)
+        print(f"Autosave: {len(batch)} vehicles in {(finished - started) * 1000:.1f} ms "
+              f"({finished - first_change:.2f} s after the first change)")
+        with self.condition:
+            self.retry_delay = 0.0
+            self.retry_at = None
+        return None
+
+    def requeue(self, batch, first_change, error):
+        # called with the condition held: the failed batch goes back to pending, where changes notified
+        # during the write are newer and win, and is retried with a growing delay
+        for id, (data, columns) in batch.items():
+            newer = self.pending.get(id)
+            self.pending[id] = (data, columns) if newer is None else (newer[0], {**columns, **newer[1]})
+        self.first_change = first_change if self.first_change is None else min(first_change, self.first_change)
+        if self.last_change is None:
+            self.last_change = first_change
+        self.failures += 1
+        self.last_error = str(error)
+        self.retry_delay = min(MAX_RETRY_DELAY, max(RETRY_DELAY, self.retry_delay * 2))
+        self.retry_at = time.perf_counter() + self.retry_delay
+        print(f"Autosave failed, {len(batch)} vehicles kept for a retry in {self.retry_delay:.1f} s: {error}")
+
+    def flush(self):
+        # waits until everything notified so far is on disk, False when a write failed
+        # (the changes stay pending and are retried)
+        with self.condition:
+            failures = self.failures
+            if self.pending:
+                self.flushing = True
+                self.condition.notify()
+            while (self.pending or self.writing) and self.failures == failures:
+                self.condition.wait()
+            return self.failures == failures
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.join()
+
+    def stats(self):
+        with self.condition:
+            queue_depth = len(self.pending)
+            failures, last_error = self.failures, self.last_error
+        latencies = list(self.latencies)
+        return {
+            'queue_depth': queue_depth,
+            'saves': self.saves,
+            'vehicles': self.saved_vehicles,
+            'last_latency': latencies[-1] if latencies else 0.0,
+            'mean_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+            'max_latency': max(latencies, default=0.0),
+            'mean_write': sum(self.write_times) / len(self.write_times) if self.write_times else 0.0,
+            'failures': failures,
+            'last_error': last_error,
+        }
@@ -0,0 +1,52 @@
+import numpy as np
+
+GRID_CELL_SIZE = 32  # pixels
+
+
+class BoxIndex:
+    # Bounding boxes of one frame in pixels of the shown frame, with a uniform grid over them:
+    # cell_boxes[cell_offsets[c]:cell_offsets[c + 1]] are the boxes overlapping grid cell c.
+    # A point query only tests the boxes of one cell.
+    def __init__(self, boxes, width, height, cell_size=GRID_CELL_SIZE):
+        self.boxes = boxes
+        self.left = (boxes['x_center'] - boxes['width'] / 2) * width
+        self.top = (boxes['y_center'] - boxes['height'] / 2) * height
+        self.width = boxes['width'] * width
+        self.height = boxes['height'] * height
+        self.area = self.width * self.height
+        self.cell_size = cell_size
+        self.columns = max(1, -(-width // cell_size))
+        self.rows = max(1, -(-height // cell_size))
+
+        # every box is put into all cells it overlaps, boxes reaching outside the frame into the edge cells
+        x0 = np.clip(self.left // cell_size, 0, self.columns - 1).astype(np.int64)
+        x1 = np.clip((self.left + self.width) // cell_size, 0, self.columns - 1).astype(np.int64)
+        y0 = np.clip(self.top // cell_size, 0, self.rows - 1).astype(np.int64)
+        y1 = np.clip((self.top + self.height) // cell_size, 0, self.rows - 1).astype(np.int64)
+        cells_x = x1 - x0 + 1
+        counts = cells_x * (y1 - y0 + 1)
+        box = np.repeat(np.arange(len(boxes)), counts)
+        k = np.arange(len(box)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell = (y0[box] + k // cells_x[box]) * self.columns + x0[box] + k % cells_x[box]
+        order = np.argsort(cell, kind='stable')
+        self.cell_boxes = box[order]
+        self.cell_offsets = np.searchsorted(cell[order], np.arange(self.columns * self.rows + 1))
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def hits(self, x, y):
+        # positions of all boxes under the point, the best hit first: the smallest box,
+        # for boxes of the same size the one drawn last (on top)
+        column, row = int(x // self.cell_size), int(y // self.cell_size)
+        if not (0 <= column < self.columns and 0 <= row < self.rows):
+            return np.empty(0, dtype=np.int64)
+        cell = row * self.columns + column
+        candidates = self.cell_boxes[self.cell_offsets[cell]:self.cell_offsets[cell + 1]]
+        inside = ((self.left[candidates] <= x) & (x <= self.left[candidates] + self.width[candidates])
+                  & (self.top[candidates] <= y) & (y <= self.top[candidates] + self.height[candidates]))
+        candidates = candidates[inside]
+        return candidates[np.lexsort((-candidates, self.area[candidates]))]
+
+    def vehicles_at(self, x, y):
+        return self.boxes['vehicle_id'][self.hits(x, y)].tolist()
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+
+EARTH_RADIUS = 6378137.0  # WGS84, metres
+TRACK_ARRAYS = ("lat", "lon", "x", "y", "heading", "speed", "distance", "smoothed_heading")
+
+
+class CameraTrack:
+    # Camera position for every video frame ("Cesta Kamery") with everything derived from it
+    # computed once for the whole track:
+    #   x, y              metres east/north of the first point (local equirectangular projection)
+    #   heading           compass heading in degrees, kept from the previous frame while standing still
+    #   speed             m/s between the previous and the current frame
+    #   distance          metres travelled since the first frame
+    #   smoothed_heading  heading averaged over smoothing_window frames, used for the map marker
+    def __init__(self, lat, lon, fps=30.0, smoothing_window=15):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.fps = fps
+        self.smoothing_window = smoothing_window
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_points(cls, points, fps=30.0, smoothing_window=15):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        track = cls(points[:, 0], points[:, 1], fps, smoothing_window)
+        track.compute()
+        return track
+
+    @classmethod
+    def load_or_compute(cls, cache_path, source_path, load_points, fps=30.0, smoothing_window=15):
+        # The cache is valid while the project file it was computed from has the same size and mtime
+        stat = os.stat(source_path) if source_path and os.path.exists(source_path) else None
+        if stat is not None and os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as data:
+                    if (int(data["source_size"]) == stat.st_size and int(data["source_mtime"]) == stat.st_mtime_ns
+                            and float(data["fps"]) == fps and int(data["smoothing_window"]) == smoothing_window):
+                        track = cls(data["lat"], data["lon"], fps, smoothing_window)
+                        for name in TRACK_ARRAYS[2:]:
+                            setattr(track, name, data[name])
+                        return track
+            except (OSError, KeyError, ValueError) as e:
+                print(f"Camera track cache {cache_path} is unreadable, recomputing: {e}")
+
+        track = cls.from_points(load_points(), fps, smoothing_window)
+        if stat is not None:
+            try:
+                np.savez(cache_path, source_size=stat.st_size, source_mtime=stat.st_mtime_ns, fps=fps,
+                         smoothing_window=smoothing_window, **{name: getattr(track, name) for name in TRACK_ARRAYS})
+            except OSError as e:
+                print(f"Could not save camera track cache {cache_path}: {e}")
+        return track
+
+    def compute(self):
+        count = len(self.lat)
+        if count == 0:
+            self.x = self.y = self.heading = self.speed = self.distance = self.smoothed_heading = np.zeros(0)
+            return
+
+        # metres east/north, longitude scaled by the cosine of the mean latitude
+        lat0 = np.radians(self.lat.mean())
+        self.x = np.radians(self.lon - self.lon[0]) * np.cos(lat0) * EARTH_RADIUS
+        self.y = np.radians(self.lat - self.lat[0]) * EARTH_RADIUS
+
+        dx = np.diff(self.x)
+        dy = np.diff(self.y)
+        step = np.hypot(dx, dy)
+        self.distance = np.concatenate(([0.0], np.cumsum(step)))
+        self.speed = np.concatenate(([0.0], step * self.fps))
+
+        # heading of every step, frames without movement keep the last known heading
+        heading = np.concatenate(([np.nan], np.degrees(np.arctan2(dx, dy)) % 360))
+        heading[1:][step == 0] = np.nan
+        valid = ~np.isnan(heading)
+        if valid.any():
+            last_valid = np.maximum.accumulate(np.where(valid, np.arange(count), -1))
+            last_valid[last_valid < 0] = np.argmax(valid)  # before the first movement use the first heading
+            heading = heading[last_valid]
+        else:
+            heading = np.zeros(count)
+        self.heading = heading
+
+        # circular moving average (through unit vectors, so 359 and 1 average to 0)
+        window = max(1, min(self.smoothing_window, count))
+        kernel = np.ones(window)
+        weights = np.convolve(np.ones(count), kernel, mode='same')
+        sin = np.convolve(np.sin(np.radians(heading)), kernel, mode='same') / weights
+        cos = np.convolve(np.cos(np.radians(heading)), kernel, mode='same') / weights
+        self.smoothed_heading = np.degrees(np.arctan2(sin, cos)) % 360
+
+    def position(self, frame_index):
+        return float(self.lat[frame_index]), float(self.lon[frame_index])
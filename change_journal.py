@@ -0,0 +1,145 @@
+import os
+import threading
+
+
+def format_vehicle_line(id, data):
+    return f"{id} {data[0]} {data[1]} {data[2]} {data[3]}\n"
+
+
+def parse_vehicle_line(line):
+    # (id, [type, lat, lon, status]) or None when the line cannot be read
+    parts = line.split()
+    if len(parts) < 4:
+        return None
+    # the type is an int as in projects (parse_vehicle), so VehicleTable gets one category code per value;
+    # a type that is not a number (e.g. "<class>" from the detector) is kept as text
+    category = int(parts[1]) if parts[1].lstrip('-').isdigit() else parts[1]
+    try:
+        return int(parts[0]), [category, float(parts[2]), float(parts[3]), parts[4] if len(parts) > 4 else ""]
+    except ValueError:
+        return None
+
+
+def read_vehicle_lines(path, vehicles):
+    # lines "id type lat lon status" (status may be empty), later lines overwrite earlier ones;
+    # an unfinished last line (crash while appending) is skipped
+    if not os.path.exists(path):
+        return vehicles
+    with open(path, 'r') as file:
+        for line in file:
+            if not line.endswith("\n") or not line.strip():
+                continue
+            vehicle = parse_vehicle_line(line)
+            if vehicle is None:
+                print(f"Skipping unreadable line in {path}: {line.strip()}")
+                continue
+            vehicles[vehicle[0]] = vehicle[1]
+    return vehicles
+
+
+class ChangeJournal:
+    # Edits of vehicles are appended to <output>.journal (one line, O(1)) instead of rewriting the output.
+    # After compact_every edits the journal is moved aside to <output>.journal.compacting and merged into
+    # the output on a background thread (temp file + rename). Loading replays both journals, so edits
+    # survive a crash at any point.
+    def __init__(self, output_path, compact_every=200):
+        self.output_path = output_path
+        self.journal_path = output_path + ".journal"
+        self.compacting_path = output_path + ".journal.compacting"
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self.journal = None
+        self.entries = 0
+        self.compaction_thread = None
+
+    def load(self):
+        # {id: [type, lat, lon, status]} from the output with all journaled edits applied
+        self.wait_for_compaction()
+        with self.lock:
+            vehicles = read_vehicle_lines(self.output_path, {})
+            read_vehicle_lines(self.compacting_path, vehicles)
+            read_vehicle_lines(self.journal_path, vehicles)
+        if os.path.exists(self.compacting_path) or os.path.exists(self.journal_path):
+            print("Recovering unsaved vehicle edits from the journal")
+            self.compact(wait=True)
+        return vehicles
+
+    def append(self, id, data):
+        self.append_many([(id, data)])
+
+    def append_many(self, items):
+        # [(id, data), ...] written with a single fsync
+        with self.lock:
+            if self.journal is None:
+                self.journal = open(self.journal_path, 'a')
+            self.journal.writelines(format_vehicle_line(id, data) for id, data in items)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.entries += len(items)
+            start_compaction = self.entries >= self.compact_every
+        if start_compaction:
+            self.compact()
+
+    def compact(self, wait=False):
+        # merges the journal into the output on a background thread, wait=True merges on the calling thread
+        running = self.compaction_thread is not None and self.compaction_thread.is_alive()
+        if running and not wait:
+            return
+        self.wait_for_compaction()
+        with self.lock:
+            self.rotate_journal()
+            if wait:
+                self.merge_journal()
+                # the journal could not be moved aside while an older one was still waiting to be merged
+                self.rotate_journal()
+                self.merge_journal()
+                return
+            self.compaction_thread = threading.Thread(target=self.merge_journal, daemon=True)
+            self.compaction_thread.start()
+
+    def rotate_journal(self):
+        # new edits go to a fresh journal, the current one is merged from .journal.compacting
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if os.path.exists(self.journal_path) and not os.path.exists(self.compacting_path):
+            os.replace(self.journal_path, self.compacting_path)
+        self.entries = 0
+
+    def merge_journal(self):
+        if not os.path.exists(self.compacting_path):
+            return
+        try:
+            edits = read_vehicle_lines(self.compacting_path, {})
+            # edited vehicles are rewritten in place, every other line of the output (also one that cannot
+            # be parsed) is copied unchanged, new vehicles are added at the end
+            lines = []
+            found = set()
+            if os.path.exists(self.output_path):
+                with open(self.output_path, 'r') as file:
+                    for line in file:
+                        parts = line.split()
+                        id = int(parts[0]) if parts and parts[0].isdigit() else None
+                        if id in edits:
+                            line = format_vehicle_line(id, edits[id])
+                            found.add(id)
+                        elif not line.endswith("\n"):
+                            line += "\n"
+                        lines.append(line)
+            lines.extend(format_vehicle_line(id, data) for id, data in edits.items() if id not in found)
+            with open(self.output_path + ".tmp", 'w') as file:
+                file.writelines(lines)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(self.output_path + ".tmp", self.output_path)
+            os.remove(self.compacting_path)
+        except OSError as e:
+            print(f"Could not merge the journal into {self.output_path}: {e}")
+
+    def wait_for_compaction(self):
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+
+    def close(self):
+        # merge everything into the output, e.g. when the application is closed
+        self.compact(wait=True)
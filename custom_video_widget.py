@@ -1,33 +1,71 @@
 import os
-from PyQt5.QtWidgets import QLabel, QSizePolicy, QToolTip, QSlider, QVBoxLayout, QSpacerItem
-from PyQt5.QtCore import QTimer, Qt, QRect
-from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen, QColor, QMouseEvent, QCursor, QKeyEvent
+import time
+from collections import deque
+from PyQt5.QtWidgets import QLabel, QSizePolicy, QToolTip, QVBoxLayout, QSpacerItem
+from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtGui import QImage, QPixmap, QMouseEvent, QCursor, QKeyEvent
+import numpy as np
 import cv2  # install opencv-python
 
+from frame_decoder import FrameDecoder, FramePrefetcher, SELECTED_BOX_COLOR, BOX_THICKNESS
+from label_store import LabelStore
+from box_index import BoxIndex
+from timeline_slider import TimelineSlider, STATUS_COLORS
+from proxy_video import ProxyBuild, find_proxy
+
+PLAYBACK_SPEEDS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+MAX_DISPLAY_FPS = 60  # faster playback shows every n-th frame, the decoder only grabs the others
+LATE_SEEK_SECONDS = 0.5  # when playback is this much behind the clock, the decoder jumps ahead instead
+PROXY_POLL_INTERVAL = 1000  # ms between checks whether the proxy of the video is built
+ZOOM_MARGIN = 0.5  # a zoomed box is shown with this fraction of its size around it on every side
+
 
 class CustomVideoWidget(QLabel):
     def __init__(self, parent=None, max_width=None, max_height=None, labels_dir=None):
         super().__init__(parent)
-        self.box_coordinates = []
-        self.bounding_boxes = {}
+        self.box_index = BoxIndex(LabelStore.empty().boxes, 0, 0)
+        self.shown_frame = None
+        self.shown_item = None  # (frame_index, frame, box_index, position) of the shown frame
+        self.zoom_frame = None  # frame of the original video shown instead of the played one when zoomed in
+        self.last_click = None  # (frame_index, x, y, vehicle ids under the cursor, position in them)
+        self.label_store = LabelStore.empty()
         self.cap = None
+        self.decoder = None
+        self.prefetcher = None
+        # playback and scrubbing use the proxy of the video once it is built, the original video is only
+        # read when the user zooms into a box
+        self.video_path = None
+        self.original_cap = None
+        self.proxy_build = None
+        self.proxy_timer = QTimer(self)
+        self.proxy_timer.timeout.connect(self.check_proxy_build)
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.setMouseTracking(True)
         self.setFocusPolicy(Qt.StrongFocus)
         self.setAlignment(Qt.AlignCenter)
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_frame)
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.is_paused = False
         self.is_seeking = False
 
+        # playback clock: (time, frame index) of the frame shown when playback (re)started,
+        # every later frame is due (frame - start frame) / (fps * speed) seconds after it
+        self.playback_speed = 1.0
+        self.clock = None
+        self.dropped_frames = 0
+        self.presented_frames = 0
+        self.jitter = deque(maxlen=100)  # seconds between when frames were due and when they were shown
+
         self.video_name = ""
         self.frame_index = 1
         self.labels_dir = labels_dir
 
         self.selected_vehicle_id = None
+        self.display_times = deque(maxlen=100)  # seconds spent on the GUI thread per shown frame
 
         self.spacer = QSpacerItem(0, 0, QSizePolicy.Expanding, QSizePolicy.Expanding)
-        self.progress_bar = QSlider(Qt.Horizontal, self)
+        self.progress_bar = TimelineSlider(self)
         self.progress_bar.setRange(1, 100)
         self.progress_bar.sliderMoved.connect(self.seek_video)
         self.progress_bar.sliderReleased.connect(self.slider_released)
@@ -36,7 +74,9 @@ class CustomVideoWidget(QLabel):
         self.layout.addWidget(self.progress_bar)
         self.setLayout(self.layout)
         self.video_duration = 0
+        self.fps = 30.0
         self.highlighted_frames = []
+        self.vehicle_statuses = np.zeros(0, dtype=np.int64)  # timeline status of every vehicle id of the label store
 
         # Set maximum size constraints if provided
         if max_width is not None:
@@ -56,144 +96,314 @@ class CustomVideoWidget(QLabel):
     def set_bounding_box_callback(self, callback):
         self.bounding_box_callback = callback
 
-    def load_video(self, video_path):
-        self.cap = cv2.VideoCapture(video_path)
-        if not self.cap.isOpened():
-            print("Error: Could not open video.")
-        else:
-            print(f"Video {video_path} loaded successfully.")
-        self.timer.start(30)  # Adjust based on video frame rate
+    def load_video(self, video_path, proxy_dir=None):
+        # proxy_dir: folder with proxies of the videos, the proxy is built there in the background if missing
+        self.stop_proxy_build()
+        self.release_original()
+        self.parse_label_files()
+        self.video_path = video_path
+        self.shown_item = None
+        self.zoom_frame = None
+        playback_path = video_path
+        if proxy_dir is not None:
+            proxy_path = find_proxy(video_path, proxy_dir)
+            if proxy_path is not None:
+                playback_path = proxy_path
+            else:
+                self.proxy_build = ProxyBuild(video_path, proxy_dir)
+                self.proxy_timer.start(PROXY_POLL_INTERVAL)
+        self.start_decoding(playback_path)
         self.frame_index = 1
         self.video_duration = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.set_playback_speed(self.playback_speed)
         self.progress_bar.setRange(1, self.video_duration)
-        self.parse_label_files()
+        self.set_box_statuses(np.zeros(len(self.label_store), dtype=np.int64))
         self.video_name = os.path.basename(video_path).split('.')[0]
         self.resume_video()
 
+    def release_video(self):
+        self.timer.stop()
+        self.stop_proxy_build()
+        self.stop_decoding()
+        self.release_original()
+        self.cap = None
+
+    def start_decoding(self, path, position=None):
+        # path is the video or the manifest of its proxy, position is where to continue (None = the start)
+        self.stop_decoding()
+        self.decoder = FrameDecoder(path, self.max_width, self.max_height, label_store=self.label_store)
+        self.decoder.selected_vehicle_id = self.selected_vehicle_id
+        self.cap = self.decoder.cap
+        if not self.cap.isOpened():
+            print("Error: Could not open video.")
+            return
+        print(f"Video {path} loaded successfully.")
+        if position is not None:
+            self.decoder.seek(position)
+        self.decoder.start()
+        self.prefetcher = FramePrefetcher(self.decoder)
+        self.prefetcher.start()
+
+    def check_proxy_build(self):
+        # switches playback to the proxy once it is built, at the frame after the shown one
+        if self.proxy_build is None or not self.proxy_build.done():
+            return
+        build, self.proxy_build = self.proxy_build, None
+        self.proxy_timer.stop()
+        proxy_path = build.finish()
+        if proxy_path is None:
+            return
+        position = self.shown_item[3] + 1 if self.shown_item is not None else None
+        self.start_decoding(proxy_path, position)
+        self.video_duration = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.progress_bar.setRange(1, self.video_duration)
+        self.set_playback_speed(self.playback_speed)
+
+    def stop_proxy_build(self):
+        self.proxy_timer.stop()
+        if self.proxy_build is not None:
+            self.proxy_build.cancel()
+            self.proxy_build = None
+
+    def release_original(self):
+        if self.original_cap is not None:
+            self.original_cap.release()
+            self.original_cap = None
+
+    def stop_decoding(self):
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+        if self.decoder is not None:
+            self.decoder.stop()
+            self.decoder = None
+
+    def prefetch_frames(self, positions):
+        # decode these positions in the background so seeking to them later is instant
+        if self.prefetcher is not None:
+            self.prefetcher.prefetch(positions)
+
     def parse_label_files(self):
-        self.bounding_boxes = {}
         if not self.labels_dir:
+            self.label_store = LabelStore.empty()
             return
-
-        for label_file in os.listdir(self.labels_dir):
-            if label_file.endswith('.txt'):
-                file_path = os.path.join(self.labels_dir, label_file)
-                with open(file_path, 'r') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) >= 7:
-                            frame_index = int(parts[0])
-                            class_id = int(parts[1])
-                            x_center, y_center = float(parts[2]), float(parts[3])
-                            width, height = float(parts[4]), float(parts[5])
-                            confidence = parts[6]
-                            if confidence != 'interpolated':
-                                confidence = float(confidence)
-                            # vehicle_id is the name of the txt file without the extension
-                            vehicle_id = int(os.path.basename(label_file).split('.')[0])
-
-                            if frame_index not in self.bounding_boxes:
-                                self.bounding_boxes[frame_index] = []
-                            self.bounding_boxes[frame_index].append(
-                                (class_id, x_center, y_center, width, height, confidence, vehicle_id)
-                            )
+        self.label_store = LabelStore.open(self.labels_dir)
 
     def read_bounding_boxes(self, frame_index):
-        return self.bounding_boxes.get(frame_index, [])
+        return self.label_store.boxes_in_frame(frame_index)
+
+    def get_vehicle_frames(self, vehicle_id):
+        # frames in which the vehicle has a bounding box, straight from the label index (no disk access)
+        return self.label_store.frames_of_vehicle(vehicle_id)
+
+    def select_vehicle(self, vehicle_id):
+        # boxes are drawn by the decoder, frames decoded from now on show the new selection
+        self.selected_vehicle_id = vehicle_id
+        if self.decoder is not None:
+            self.decoder.selected_vehicle_id = vehicle_id
 
     def update_frame(self):
+        # shows the frame that is due by the playback clock, frames that are already late are dropped
         self.setFocus()
-        if self.cap is not None and self.cap.isOpened() and not self.is_paused and not self.is_seeking:
-            ret, frame = self.cap.read()
-            if ret:
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                height, width, channel = frame.shape
-                step = channel * width
-
-                # Read bounding boxes for the current frame
-                current_frame_bounding_boxes = self.read_bounding_boxes(self.frame_index)
-                print(f"Frame {self.frame_index}: {len(current_frame_bounding_boxes)} bounding boxes")
-                self.frame_index += 1
-
-                q_img = QImage(frame.data, width, height, step, QImage.Format_RGB888)
-                pixmap = QPixmap.fromImage(q_img)
-
-                # Scale the pixmap to fit within the maximum width and height while maintaining the aspect ratio
-                if self.max_width is not None and self.max_height is not None:
-                    pixmap = pixmap.scaled(self.max_width, self.max_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-
-                # Draw bounding boxes on the pixmap
-                painter = QPainter(pixmap)
-                pen_nehotovo = QPen(QColor(255, 0, 0), 2)
-                pen_selected = QPen(QColor(255, 165, 0), 2)
-                pen_hotovo = QPen(QColor(0, 0, 255), 2)
-                pen_disabled = QPen(QColor(128, 128, 128), 2)
-                self.box_coordinates = []  # Store box coordinates separately
-                for box in current_frame_bounding_boxes:
-                    class_id, x_center, y_center, box_width, box_height, confidence, vehicle_id = box
-                    if vehicle_id == self.selected_vehicle_id:
-                        painter.setPen(pen_selected)
-                    else:
-                        painter.setPen(pen_nehotovo)
-                    top_left_x = (x_center - box_width / 2) * pixmap.width()
-                    top_left_y = (y_center - box_height / 2) * pixmap.height()
-                    rect_width = box_width * pixmap.width()
-                    rect_height = box_height * pixmap.height()
-                    painter.drawRect(QRect(top_left_x, top_left_y, rect_width, rect_height))
-                    self.box_coordinates.append((class_id, confidence, top_left_x, top_left_y, rect_width, rect_height, vehicle_id))
-                painter.end()
-
-                self.setPixmap(pixmap)
-                # align pixmap to top
-                self.setAlignment(Qt.AlignTop)
-
-                if self.frame_update_callback:
-                    self.frame_update_callback(self.frame_index)
-
-                self.progress_bar.setValue(self.frame_index)
-
-            else:
+        if self.cap is None or not self.cap.isOpened() or self.is_paused or self.is_seeking:
+            print("Video capture not opened or is paused (seeking).")
+            return
+        buffer = self.decoder.buffer
+        item = buffer.peek()
+        if item is None:
+            if self.decoder.is_finished():
                 print("Video ended or frame not available.")
-                self.cap.release()
                 self.timer.stop()
-        else:
-            print("Video capture not opened or is paused (seeking).")
+            return
+
+        now = time.perf_counter()
+        if self.clock is None:
+            self.clock = (now, item[0])
+        frames_per_second = self.fps * self.playback_speed
+        due = self.clock[1] + (now - self.clock[0]) * frames_per_second
+        if item[0] > due:
+            return
+        item = buffer.get()
+        next_item = buffer.peek()
+        while next_item is not None and next_item[0] <= due:
+            self.dropped_frames += 1
+            item = buffer.get()
+            next_item = buffer.peek()
+
+        late = due - item[0]
+        if late > LATE_SEEK_SECONDS * frames_per_second:
+            # decoding cannot keep up, continue from where the clock is instead of decoding every frame
+            print(f"Playback {late:.0f} frames behind, skipping ahead")
+            self.dropped_frames += int(late)
+            self.decoder.seek(int(due + 1))
+
+        self.jitter.append(now - (self.clock[0] + (item[0] - self.clock[1]) / frames_per_second))
+        self.presented_frames += 1
+        self.display_frame(*item)
+
+    def set_playback_speed(self, speed):
+        self.playback_speed = speed
+        self.clock = None
+        if self.decoder is not None:
+            self.decoder.frame_step = max(1, int(np.ceil(self.fps * speed / MAX_DISPLAY_FPS)))
+        if self.timer.isActive():
+            self.timer.start(self.timer_interval())
+
+    def change_playback_speed(self, steps):
+        # one step up or down in PLAYBACK_SPEEDS (skip_dopredu / skip_dozadu)
+        i = min(range(len(PLAYBACK_SPEEDS)), key=lambda i: abs(PLAYBACK_SPEEDS[i] - self.playback_speed))
+        self.set_playback_speed(PLAYBACK_SPEEDS[max(0, min(len(PLAYBACK_SPEEDS) - 1, i + steps))])
+        return self.playback_speed
+
+    def timer_interval(self):
+        # the timer ticks at least twice per shown frame (and at least every 10 ms), so frames are shown
+        # at most half a frame late
+        shown_per_second = min(self.fps * self.playback_speed, MAX_DISPLAY_FPS)
+        return max(1, min(10, int(500 / shown_per_second)))
+
+    def playback_stats(self):
+        jitter = [abs(j) for j in self.jitter]
+        return {
+            'speed': self.playback_speed,
+            'presented': self.presented_frames,
+            'dropped': self.dropped_frames,
+            'mean_jitter': sum(jitter) / len(jitter) if jitter else 0.0,
+            'max_jitter': max(jitter, default=0.0),
+        }
+
+    def display_frame(self, frame_index, frame, box_index, position):
+        # frame is scaled, in the QImage.Format_RGB32 layout and has the bounding boxes drawn in by the decoder
+        # thread, here it is only wrapped in a QImage without copying. On the raster platforms QPixmap.fromImage
+        # keeps using that memory for Format_RGB32 (checked: writes to the array show in the pixmap), so the frame
+        # is kept referenced and the decoder does not reuse its buffer while it is shown.
+        started = time.perf_counter()
+
+        self.frame_index = frame_index + 1
+        self.box_index = box_index
+        self.shown_frame = frame
+        self.shown_item = (frame_index, frame, box_index, position)
+        self.zoom_frame = None
+        self.decoder.overlay.displayed = frame
+
+        self.show_image(frame)
+
+        if self.frame_update_callback:
+            self.frame_update_callback(self.frame_index)
+
+        self.progress_bar.setValue(self.frame_index)
+        self.display_times.append(time.perf_counter() - started)
+        print(f"Frame {frame_index}: {len(box_index)} bounding boxes, overlay {self.decoder.overlay.mean_time() * 1000:.2f} ms, "
+              f"display {sum(self.display_times) / len(self.display_times) * 1000:.2f} ms")
+
+    def show_image(self, frame):
+        height, width = frame.shape[:2]
+        q_img = QImage(frame.data, width, height, frame.strides[0], QImage.Format_RGB32)
+        pixmap = QPixmap.fromImage(q_img)
+        self.setPixmap(pixmap)
+        # align pixmap to top
+        self.setAlignment(Qt.AlignTop)
+
+    def zoom_to_box(self, box):
+        # Shows the box (position in box_index) cut out of the full resolution original video, scaled up
+        # to the size of the shown frame. Only this one frame is decoded from the original.
+        if self.shown_item is None or self.video_path is None:
+            return
+        if self.original_cap is None:
+            self.original_cap = cv2.VideoCapture(self.video_path)
+        started = time.perf_counter()
+        self.original_cap.set(cv2.CAP_PROP_POS_FRAMES, self.shown_item[3])
+        ret, frame = self.original_cap.read()
+        if not ret:
+            print("Error: Could not read the frame from the original video.")
+            return
+
+        height, width = frame.shape[:2]
+        shown_height, shown_width = self.shown_frame.shape[:2]
+        bounding_box = self.box_index.boxes[box]
+        x_center, y_center = bounding_box['x_center'] * width, bounding_box['y_center'] * height
+        box_width, box_height = bounding_box['width'] * width, bounding_box['height'] * height
+        # the cut out has the aspect ratio of the shown frame, so it fills the same area
+        crop_width = max(box_width * (1 + 2 * ZOOM_MARGIN), box_height * (1 + 2 * ZOOM_MARGIN) * shown_width / shown_height)
+        crop_width = min(crop_width, width, height * shown_width / shown_height)
+        crop_height = crop_width * shown_height / shown_width
+        x0 = int(np.clip(x_center - crop_width / 2, 0, width - crop_width))
+        y0 = int(np.clip(y_center - crop_height / 2, 0, height - crop_height))
+        crop = frame[y0:y0 + max(1, int(crop_height)), x0:x0 + max(1, int(crop_width))]
+
+        scale = shown_width / crop.shape[1]
+        zoomed = cv2.resize(crop, (shown_width, shown_height), interpolation=cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA)
+        zoomed = cv2.cvtColor(zoomed, cv2.COLOR_BGR2BGRA)
+        top_left = (int((x_center - box_width / 2 - x0) * scale), int((y_center - box_height / 2 - y0) * scale))
+        bottom_right = (int((x_center + box_width / 2 - x0) * scale), int((y_center + box_height / 2 - y0) * scale))
+        cv2.rectangle(zoomed, top_left, bottom_right, SELECTED_BOX_COLOR, BOX_THICKNESS)
+
+        # no hit-testing on the zoomed frame, a click goes back to the played frame
+        self.zoom_frame = zoomed
+        self.box_index = BoxIndex(LabelStore.empty().boxes, 0, 0)
+        self.setCursor(QCursor(Qt.ArrowCursor))
+        self.show_image(zoomed)
+        print(f"Zoomed into vehicle {bounding_box['vehicle_id']} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def unzoom(self):
+        if self.zoom_frame is not None and self.shown_item is not None:
+            self.display_frame(*self.shown_item)
 
     def seek_video(self, position):
         if self.cap is not None and self.cap.isOpened():
             print(f"Seeking to position: {position}")
             self.is_seeking = True
-            self.cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            self.clock = None
+            self.decoder.seek(position)
             self.frame_index = position
-            self.update_frame()
+            # Wait for the decoder to deliver the target frame so the seek is visible even when paused
+            item = self.decoder.buffer.get(timeout=1.0)
+            if item is not None:
+                self.display_frame(*item)
             self.is_seeking = False
 
     def mousePressEvent(self, event: QMouseEvent):
         self.pause_video()
-        if self.box_coordinates:
-            x = event.x()
-            y = event.y()
-            box_clicked = False
-            for class_id, confidence, top_left_x, top_left_y, rect_width, rect_height, vehicle_id in self.box_coordinates:
-                if top_left_x <= x <= top_left_x + rect_width and top_left_y <= y <= top_left_y + rect_height:
-                    if self.bounding_box_callback:
-                        self.bounding_box_callback(vehicle_id)
-                    box_clicked = True
-                    break
-            if not box_clicked:
-                QToolTip.hideText()
+        if self.zoom_frame is not None:
+            self.unzoom()
+            return
+        x = event.x()
+        y = event.y()
+        if event.modifiers() & Qt.ControlModifier:
+            self.zoom_at(x, y)
+            return
+        vehicle_ids = self.box_index.vehicles_at(x, y)
+        if not vehicle_ids:
+            self.last_click = None
+            QToolTip.hideText()
+            return
+        # repeated clicks on the same spot go through all overlapping boxes, the smallest first
+        position = 0
+        if self.last_click is not None:
+            frame_index, last_x, last_y, last_ids, last_position = self.last_click
+            if frame_index == self.frame_index and last_ids == vehicle_ids and abs(x - last_x) + abs(y - last_y) <= 4:
+                position = (last_position + 1) % len(vehicle_ids)
+        self.last_click = (self.frame_index, x, y, vehicle_ids, position)
+        if self.bounding_box_callback:
+            self.bounding_box_callback(vehicle_ids[position])
+
+    def mouseDoubleClickEvent(self, event: QMouseEvent):
+        # quick repeated clicks keep cycling through overlapping boxes, Ctrl+click zooms
+        self.mousePressEvent(event)
+
+    def zoom_at(self, x, y):
+        # zooms into the box of the selected vehicle under the point, otherwise into the best hit
+        hits = self.box_index.hits(x, y)
+        if not len(hits):
+            return
+        selected = hits[self.box_index.boxes['vehicle_id'][hits] == self.selected_vehicle_id]
+        self.zoom_to_box(selected[0] if len(selected) else hits[0])
 
     def mouseMoveEvent(self, event: QMouseEvent):
-        if self.box_coordinates:
-            x = event.x()
-            y = event.y()
-            hovering_over_box = False
-            for class_id, confidence, top_left_x, top_left_y, rect_width, rect_height, vehicle_id in self.box_coordinates:
-                if top_left_x <= x <= top_left_x + rect_width and top_left_y <= y <= top_left_y + rect_height:
-                    self.setCursor(QCursor(Qt.PointingHandCursor))
-                    hovering_over_box = True
-                    break
-            if not hovering_over_box:
+        if len(self.box_index):
+            if len(self.box_index.hits(event.x(), event.y())):
+                self.setCursor(QCursor(Qt.PointingHandCursor))
+            else:
                 self.setCursor(QCursor(Qt.ArrowCursor))
 
     def keyPressEvent(self, event: QKeyEvent):
@@ -213,7 +423,8 @@ class CustomVideoWidget(QLabel):
 
     def resume_video(self):
         self.is_paused = False
-        self.timer.start(30)
+        self.clock = None
+        self.timer.start(self.timer_interval())
 
     def slider_released(self):
         if self.is_paused:
@@ -232,27 +443,24 @@ class CustomVideoWidget(QLabel):
         self.seek_video(self.frame_index - 1)
 
     def update_progress_bar(self):
-        # Custom paint on progress bar to highlight specific frames
-        class HighlightedSlider(QSlider):
-            def __init__(self, highlighted_frames, *args, **kwargs):
-                super().__init__(*args, **kwargs)
-                self.highlighted_frames = highlighted_frames
-                self.setValue(highlighted_frames[0] if highlighted_frames else 0)
-
-            def paintEvent(self, event):
-                painter = QPainter(self)
-                pen = QPen(QColor(71, 187, 237), 3)
-                painter.setPen(pen)
-                for frame in self.highlighted_frames:
-                    position = int(frame / self.maximum() * self.width())
-                    painter.drawLine(position, 0, position, 8)
-
-                super().paintEvent(event)  # Draw the default slider on top of the highlighted frames
-
-        self.layout.removeWidget(self.progress_bar)
-        self.progress_bar.destroy()
-        self.progress_bar = HighlightedSlider(self.highlighted_frames, Qt.Horizontal, self)
-        self.progress_bar.setRange(1, self.video_duration)
-        self.progress_bar.sliderMoved.connect(self.seek_video)
-        self.progress_bar.sliderReleased.connect(self.slider_released)
-        self.layout.addWidget(self.progress_bar)
+        # the timeline stays, only its bitmap of highlighted frames is rendered again
+        self.progress_bar.set_highlighted_frames(self.highlighted_frames)
+        self.progress_bar.setValue(int(self.highlighted_frames[0]) if len(self.highlighted_frames) else 0)
+
+    def set_box_statuses(self, statuses):
+        # status of the vehicle of every bounding box in the label store (index into STATUS_COLORS),
+        # the timeline shows the detections of the whole video coloured by it
+        frames = self.label_store.boxes['frame'].astype(np.int64)
+        frame_count = max(self.video_duration, int(frames.max()) + 1 if len(frames) else 0)
+        counts = np.bincount(frames * len(STATUS_COLORS) + statuses, minlength=frame_count * len(STATUS_COLORS))
+        self.progress_bar.set_status_counts(counts.reshape(-1, len(STATUS_COLORS)))
+        self.vehicle_statuses = np.zeros(max(0, len(self.label_store.vehicle_offsets) - 1), dtype=np.int64)
+        self.vehicle_statuses[self.label_store.boxes['vehicle_id']] = statuses
+
+    def set_vehicle_status(self, vehicle_id, status):
+        # after one vehicle changed its status only its detections move to the new status on the timeline
+        frames = self.label_store.frames_of_vehicle(vehicle_id)
+        if not len(frames) or self.vehicle_statuses[vehicle_id] == status:
+            return
+        self.progress_bar.move_status_counts(frames, self.vehicle_statuses[vehicle_id], status)
+        self.vehicle_statuses[vehicle_id] = status
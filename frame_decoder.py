@@ -0,0 +1,296 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import cv2  # install opencv-python
+
+from seek_engine import KeyframeIndex, SeekEngine, GopCache
+from label_store import LabelStore
+from box_index import BoxIndex
+from proxy_video import open_capture, is_proxy
+
+PREFETCH_FRAMES = 5  # frames decoded from every prefetch target on
+# prefetched frames are kept apart from the frames of playback, which would push them out of the shared
+# LRU within seconds; this is room for two rounds of prefetching the next 3 vehicles
+PREFETCH_CACHE_FRAMES = 30
+
+# colours of bounding boxes in the overlay frames, which are BGRA (QImage.Format_RGB32)
+BOX_COLOR = (0, 0, 255, 255)
+SELECTED_BOX_COLOR = (0, 165, 255, 255)
+BOX_THICKNESS = 2
+
+
+class FrameRingBuffer:
+    # Bounded FIFO of decoded frames shared between the decoder thread and the GUI thread.
+    # Every seek bumps the generation so frames decoded before the seek are thrown away.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.frames = deque()
+        self.generation = 0
+        self.condition = threading.Condition()
+        self.taken = None  # the last item get() returned, the GUI may not have shown it yet
+
+    def __len__(self):
+        with self.condition:
+            return len(self.frames)
+
+    def put(self, generation, item):
+        with self.condition:
+            while len(self.frames) >= self.capacity and generation == self.generation:
+                self.condition.wait()
+            if generation != self.generation:
+                return False
+            self.frames.append(item)
+            self.condition.notify_all()
+            return True
+
+    def peek(self):
+        with self.condition:
+            return self.frames[0] if self.frames else None
+
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.frames and timeout:
+                self.condition.wait_for(lambda: self.frames, timeout)
+            if not self.frames:
+                return None
+            item = self.frames.popleft()
+            self.taken = item
+            self.condition.notify_all()
+            return item
+
+    def frames_in_use(self):
+        # frames of the waiting items and of the last taken one
+        with self.condition:
+            frames = [item[1] for item in self.frames]
+            if self.taken is not None:
+                frames.append(self.taken[1])
+            return frames
+
+    def clear(self):
+        with self.condition:
+            self.frames.clear()
+            self.generation += 1
+            self.condition.notify_all()
+
+
+class FrameDecoder(threading.Thread):
+    # Reads frames ahead of playback on its own thread, converts them to RGB and scales them
+    # to the widget size, so the GUI thread only has to show the next ready frame.
+    # Buffer items are (frame_index, frame with the bounding boxes drawn in, BoxIndex of the boxes,
+    # position of the frame in the video).
+    def __init__(self, video_path, max_width=None, max_height=None, buffer_size=32, label_store=None):
+        super().__init__(daemon=True)
+        self.video_path = video_path
+        self.cap = open_capture(video_path)  # the video or its proxy (manifest.npz)
+        self.max_width = max_width
+        self.max_height = max_height
+        self.buffer = FrameRingBuffer(buffer_size)
+        self.seek_engine = SeekEngine(self.cap)
+        self.prefetch_cache = GopCache(PREFETCH_CACHE_FRAMES)  # filled by FramePrefetcher only
+        self.label_store = label_store if label_store is not None else LabelStore.empty()
+        # up to buffer_size frames wait in the buffer, one is taken by the GUI, one is shown and one is being
+        # composed, so there is always a free overlay buffer
+        self.overlay = OverlayCompositor(buffer_size + 3)
+        self.selected_vehicle_id = None
+
+        # Frames played from the start are labelled from 1, after a seek the label equals the position
+        self.next_frame_index = 1
+        self.next_position = 0
+        self.pending_seek = None
+        self.end_of_stream = False
+        self.running = True
+        # every frame_step-th frame is delivered, the frames between are only grabbed (fast playback)
+        self.frame_step = 1
+
+    def seek(self, position):
+        with self.buffer.condition:
+            self.pending_seek = position
+            self.end_of_stream = False
+            self.buffer.clear()
+
+    def start(self):
+        super().start()
+        # The keyframe index needs a pass over the whole file the first time, build it on the side
+        threading.Thread(target=self.load_keyframe_index, daemon=True).start()
+
+    def load_keyframe_index(self):
+        if is_proxy(self.video_path):
+            # every frame of a proxy is a keyframe
+            self.seek_engine.keyframe_index = KeyframeIndex(np.arange(int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))))
+            return
+        try:
+            self.seek_engine.keyframe_index = KeyframeIndex.load_or_build(self.video_path)
+        except OSError as e:
+            print(f"Keyframe index not available: {e}")
+
+    def stop(self):
+        with self.buffer.condition:
+            self.running = False
+            self.buffer.clear()
+        if self.is_alive():
+            self.join()
+        self.cap.release()
+
+    def run(self):
+        while True:
+            with self.buffer.condition:
+                if not self.running:
+                    break
+                if self.pending_seek is not None:
+                    self.next_frame_index = self.pending_seek
+                    self.next_position = self.pending_seek
+                    self.pending_seek = None
+                if self.end_of_stream:
+                    # Nothing left to decode, sleep until somebody seeks back
+                    self.buffer.condition.wait()
+                    continue
+                generation = self.buffer.generation
+                frame_index = self.next_frame_index
+                position = self.next_position
+
+            gop = self.seek_engine.gop_of(position)
+            frame = self.seek_engine.cache.get(gop, position)
+            if frame is None:
+                frame = self.prefetch_cache.get(gop, position)
+            if frame is None:
+                self.seek_engine.seek(position)
+                ret, frame = self.seek_engine.read()
+                if not ret:
+                    with self.buffer.condition:
+                        if generation == self.buffer.generation:
+                            self.end_of_stream = True
+                            self.buffer.condition.notify_all()
+                    continue
+                frame = self.convert_frame(frame)
+                self.seek_engine.cache.put(gop, position, frame)
+
+            # the hit-test grid and the boxes are done here too, the frame in the cache stays without boxes
+            box_index = BoxIndex(self.label_store.boxes_in_frame(frame_index), frame.shape[1], frame.shape[0])
+            in_use = self.buffer.frames_in_use() + [self.overlay.displayed]
+            frame = self.overlay.compose(frame, box_index, self.selected_vehicle_id, in_use)
+            if self.buffer.put(generation, (frame_index, frame, box_index, position)):
+                self.next_frame_index = frame_index + self.frame_step
+                self.next_position = position + self.frame_step
+
+    def convert_frame(self, frame):
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self.max_width is None or self.max_height is None:
+            return frame
+
+        # Scale to fit within the maximum width and height while maintaining the aspect ratio
+        height, width = frame.shape[:2]
+        scale = min(self.max_width / width, self.max_height / height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if size == (width, height):
+            return frame
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        return cv2.resize(frame, size, interpolation=interpolation)
+
+    def is_finished(self):
+        with self.buffer.condition:
+            return self.end_of_stream and not self.buffer.frames
+
+
+class OverlayCompositor:
+    # Draws the bounding boxes into a BGRA copy of the RGB frame, the layout of QImage.Format_RGB32,
+    # so the GUI can show it without any conversion. The copies are made into a ring of buffers
+    # allocated once; buffers still waiting in the frame buffer, taken by the GUI or shown (displayed)
+    # are skipped, the pixmap of the shown frame uses its memory.
+    def __init__(self, buffer_count):
+        self.buffers = [None] * buffer_count
+        self.next_buffer = 0
+        self.displayed = None
+        self.times = deque(maxlen=100)  # seconds per frame
+
+    def compose(self, frame, box_index, selected_vehicle_id=None, in_use=()):
+        started = time.perf_counter()
+        in_use = {id(buffer) for buffer in in_use if buffer is not None}
+        for _ in range(len(self.buffers)):
+            if id(self.buffers[self.next_buffer]) not in in_use:
+                break
+            self.next_buffer = (self.next_buffer + 1) % len(self.buffers)
+        else:
+            raise RuntimeError("No free overlay buffer")
+        buffer = self.buffers[self.next_buffer]
+        if buffer is None or buffer.shape[:2] != frame.shape[:2]:
+            buffer = self.buffers[self.next_buffer] = np.empty((frame.shape[0], frame.shape[1], 4), dtype=np.uint8)
+        self.next_buffer = (self.next_buffer + 1) % len(self.buffers)
+        cv2.cvtColor(frame, cv2.COLOR_RGB2BGRA, dst=buffer)
+
+        if len(box_index):
+            # corners of all rectangles at once, one polylines call per colour
+            x0 = box_index.left.astype(np.int32)
+            y0 = box_index.top.astype(np.int32)
+            x1 = x0 + box_index.width.astype(np.int32)
+            y1 = y0 + box_index.height.astype(np.int32)
+            corners = np.stack((np.column_stack((x0, y0)), np.column_stack((x1, y0)),
+                                np.column_stack((x1, y1)), np.column_stack((x0, y1))), axis=1)
+            selected = box_index.boxes['vehicle_id'] == selected_vehicle_id
+            cv2.polylines(buffer, list(corners[~selected]), True, BOX_COLOR, BOX_THICKNESS)
+            if selected.any():
+                cv2.polylines(buffer, list(corners[selected]), True, SELECTED_BOX_COLOR, BOX_THICKNESS)
+        self.times.append(time.perf_counter() - started)
+        return buffer
+
+    def mean_time(self):
+        return sum(self.times) / len(self.times) if self.times else 0.0
+
+
+class FramePrefetcher(threading.Thread):
+    # Decodes frames the user is likely to jump to next (e.g. the first frames of the next vehicles)
+    # on a second capture and puts them into the decoder's prefetch cache, so the jump is served from memory.
+    def __init__(self, decoder, frames_per_target=PREFETCH_FRAMES):
+        super().__init__(daemon=True)
+        self.decoder = decoder
+        self.cap = open_capture(decoder.video_path)
+        self.seek_engine = SeekEngine(self.cap)
+        self.frames_per_target = frames_per_target
+        self.targets = deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.prefetched = 0
+
+    def prefetch(self, positions):
+        # a new request replaces the targets that have not been decoded yet
+        with self.condition:
+            self.targets = deque(positions)
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.targets.clear()
+            self.condition.notify()
+        if self.is_alive():
+            self.join()
+        self.cap.release()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.targets:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                position = self.targets.popleft()
+            self.prefetch_target(position)
+
+    def prefetch_target(self, start):
+        # cache keys have to be the decoder's, so its keyframe index is used for both
+        decoder_engine = self.decoder.seek_engine
+        self.seek_engine.keyframe_index = decoder_engine.keyframe_index
+        for position in range(start, start + self.frames_per_target):
+            if not self.running:
+                break
+            gop = decoder_engine.gop_of(position)
+            if (decoder_engine.cache.get(gop, position) is not None
+                    or self.decoder.prefetch_cache.get(gop, position) is not None):
+                continue
+            self.seek_engine.seek(position)
+            ret, frame = self.seek_engine.read()
+            if not ret:
+                break
+            self.decoder.prefetch_cache.put(gop, position, self.decoder.convert_frame(frame))
+            self.prefetched += 1
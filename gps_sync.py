@@ -0,0 +1,157 @@
+import os
+import sys
+
+import numpy as np
+import cv2  # install opencv-python
+
+from project_file import CAMERA_TRACK_SECTION
+
+
+def load_gps_fixes(file_path):
+    # "lat, lon" or "lat, lon, time" per line (time in seconds), returns (fixes, timestamps or None)
+    data = np.loadtxt(file_path, delimiter=',', ndmin=2)
+    if data.shape[1] >= 3:
+        return data[:, :2], data[:, 2]
+    return data[:, :2], None
+
+
+def clean_fixes(fixes, timestamps, repeated="keep"):
+    # Sorts fixes by time and drops fixes with the same timestamp. Repeated positions (the receiver
+    # sending the last fix again) are either kept, so the camera stands still ("keep"), or dropped,
+    # so the position is interpolated to the next new fix ("interpolate").
+    order = np.argsort(timestamps, kind='stable')
+    fixes, timestamps = fixes[order], timestamps[order]
+    keep = np.ones(len(fixes), dtype=bool)
+    keep[1:] = np.diff(timestamps) > 0
+    if repeated == "interpolate":
+        same = np.all(fixes[1:] == fixes[:-1], axis=1)
+        keep[1:] &= ~same
+        keep[-1] = True  # the track still ends at the last fix
+        if len(timestamps) > 1 and timestamps[-1] == timestamps[-2]:
+            keep[-2] = False
+    elif repeated != "keep":
+        raise ValueError(f"Unknown handling of repeated fixes: {repeated}")
+    return fixes[keep], timestamps[keep]
+
+
+def interpolate_linear(fixes, timestamps, frame_times):
+    lat = np.interp(frame_times, timestamps, fixes[:, 0])
+    lon = np.interp(frame_times, timestamps, fixes[:, 1])
+    return np.column_stack((lat, lon))
+
+
+def segment_positions(timestamps, frame_times):
+    # index of the segment every frame falls into and how far along it is (0..1)
+    segment = np.clip(np.searchsorted(timestamps, frame_times, side='right') - 1, 0, len(timestamps) - 2)
+    duration = timestamps[segment + 1] - timestamps[segment]
+    fraction = np.clip((frame_times - timestamps[segment]) / duration, 0.0, 1.0)
+    return segment, fraction
+
+
+def interpolate_great_circle(fixes, timestamps, frame_times):
+    # spherical linear interpolation between unit vectors of the fixes
+    lat, lon = np.radians(fixes[:, 0]), np.radians(fixes[:, 1])
+    vectors = np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+    segment, fraction = segment_positions(timestamps, frame_times)
+    a, b = vectors[segment], vectors[segment + 1]
+    angle = np.arccos(np.clip(np.sum(a * b, axis=1), -1.0, 1.0))
+    sin_angle = np.sin(angle)
+    moving = sin_angle > 1e-12
+    wa = np.where(moving, np.sin((1 - fraction) * angle) / np.where(moving, sin_angle, 1.0), 1 - fraction)
+    wb = np.where(moving, np.sin(fraction * angle) / np.where(moving, sin_angle, 1.0), fraction)
+    v = a * wa[:, None] + b * wb[:, None]
+    return np.column_stack((np.degrees(np.arctan2(v[:, 2], np.hypot(v[:, 0], v[:, 1]))),
+                            np.degrees(np.arctan2(v[:, 1], v[:, 0]))))
+
+
+def interpolate_spline(fixes, timestamps, frame_times):
+    # cubic Hermite spline (Catmull-Rom tangents for uneven timestamps), passes through every fix
+    tangents = np.empty_like(fixes)
+    tangents[1:-1] = (fixes[2:] - fixes[:-2]) / (timestamps[2:] - timestamps[:-2])[:, None]
+    tangents[0] = (fixes[1] - fixes[0]) / (timestamps[1] - timestamps[0])
+    tangents[-1] = (fixes[-1] - fixes[-2]) / (timestamps[-1] - timestamps[-2])
+    segment, s = segment_positions(timestamps, frame_times)
+    duration = (timestamps[segment + 1] - timestamps[segment])[:, None]
+    s = s[:, None]
+    h00 = 2 * s ** 3 - 3 * s ** 2 + 1
+    h10 = s ** 3 - 2 * s ** 2 + s
+    h01 = -2 * s ** 3 + 3 * s ** 2
+    h11 = s ** 3 - s ** 2
+    return (h00 * fixes[segment] + h10 * duration * tangents[segment]
+            + h01 * fixes[segment + 1] + h11 * duration * tangents[segment + 1])
+
+
+INTERPOLATIONS = {
+    "linear": interpolate_linear,
+    "great_circle": interpolate_great_circle,
+    "spline": interpolate_spline,
+}
+
+
+def synchronize_gps(fixes, frame_count, fps, timestamps=None, fix_interval=1.0, method="linear", repeated="keep"):
+    # Camera position for every video frame from GPS fixes. Without timestamps the fixes are taken
+    # as coming every fix_interval seconds from the first frame on. Frames before the first or after
+    # the last fix get the first or the last position.
+    fixes = np.asarray(fixes, dtype=np.float64).reshape(-1, 2)
+    if timestamps is None:
+        timestamps = np.arange(len(fixes)) * fix_interval
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if len(fixes) == 0:
+        raise ValueError("No GPS fixes to synchronize")
+    if method not in INTERPOLATIONS:
+        raise ValueError(f"Unknown interpolation method: {method}")
+
+    fixes, timestamps = clean_fixes(fixes, timestamps, repeated)
+    frame_times = np.arange(frame_count) / fps
+    if len(fixes) == 1:
+        return np.repeat(fixes, frame_count, axis=0)
+    return INTERPOLATIONS[method](fixes, timestamps, frame_times)
+
+
+def format_track(track, separator=" "):
+    return "".join(f"{lat!r}{separator}{lon!r}\n" for lat, lon in track.tolist())
+
+
+def write_camera_track_section(project_path, track):
+    # Replaces the "Cesta Kamery" section of a .pconf.txt project (or appends it when missing)
+    with open(project_path, 'r') as file:
+        lines = file.readlines()
+    section = [f">--- {CAMERA_TRACK_SECTION}\n", format_track(track), "*KONEC\n"]
+
+    start = next((i for i, line in enumerate(lines) if line.startswith(f">--- {CAMERA_TRACK_SECTION}")), None)
+    if start is None:
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        lines += section
+    else:
+        end = next((i for i in range(start + 1, len(lines)) if lines[i].startswith("*KONEC")), len(lines) - 1)
+        lines[start:end + 1] = section
+
+    with open(project_path + ".tmp", 'w') as file:
+        file.writelines(lines)
+    os.replace(project_path + ".tmp", project_path)
+
+
+def synchronize_video(gps_path, video_path, output_path, method="linear", repeated="keep"):
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+
+    fixes, timestamps = load_gps_fixes(gps_path)
+    track = synchronize_gps(fixes, frame_count, fps, timestamps, method=method, repeated=repeated)
+    if output_path.endswith(".pconf.txt"):
+        write_camera_track_section(output_path, track)
+    else:
+        with open(output_path, 'w') as file:
+            file.write(format_track(track, ", "))
+    print(f"Synchronized {len(fixes)} GPS fixes to {frame_count} frames ({fps} fps) -> {output_path}")
+    return track
+
+
+if __name__ == "__main__":
+    # python gps_sync.py <gps.txt> <video> <output.txt | project.pconf.txt> [linear|great_circle|spline]
+    if len(sys.argv) < 4:
+        print("Usage: python gps_sync.py <gps.txt> <video> <output.txt | project.pconf.txt> [linear|great_circle|spline]")
+        sys.exit(1)
+    synchronize_video(sys.argv[1], sys.argv[2], sys.argv[3], *sys.argv[4:5])
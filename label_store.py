@@ -0,0 +1,232 @@
+import io
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# One row per bounding box, confidence of interpolated boxes is stored as NaN
+BOX_DTYPE = np.dtype([
+    ('frame', 'i4'),
+    ('class_id', 'i4'),
+    ('x_center', 'f4'),
+    ('y_center', 'f4'),
+    ('width', 'f4'),
+    ('height', 'f4'),
+    ('confidence', 'f4'),
+    ('vehicle_id', 'i4'),
+])
+
+# Size and modification time of every label file the cache was built from
+MANIFEST_DTYPE = np.dtype([
+    ('vehicle_id', 'i4'),
+    ('size', 'i8'),
+    ('mtime_ns', 'i8'),
+])
+
+LABEL_COLUMNS = 7
+CACHE_DIR_NAME = ".label_cache"
+CACHE_ARRAYS = ("boxes", "frame_offsets", "vehicle_frames", "vehicle_offsets")
+CACHE_POINTER_NAME = "current.txt"  # name of the generation directory of the cache in use
+PARALLEL_MIN_FILES = 64  # below this starting worker processes costs more than it saves
+
+
+def parse_label_file(file_path, vehicle_id):
+    # labels/<vehicle_id>.txt: frame class_id x_center y_center width height confidence
+    with open(file_path, 'r') as f:
+        text = f.read().replace('interpolated', 'nan')
+    # fast path: the whole file at once; loadtxt checks every line has at least LABEL_COLUMNS values
+    # and ignores the extra ones, blank lines are skipped
+    try:
+        if not text.strip():
+            values = np.empty((0, LABEL_COLUMNS))
+        else:
+            values = np.loadtxt(io.StringIO(text), dtype=np.float64, usecols=range(LABEL_COLUMNS), ndmin=2, comments=None)
+    except ValueError:
+        # short or broken lines: read line by line, the first LABEL_COLUMNS values of each line with enough of them
+        rows = []
+        for line in text.splitlines():
+            parts = line.split()
+            if len(parts) < LABEL_COLUMNS:
+                continue
+            try:
+                rows.append([float(part) for part in parts[:LABEL_COLUMNS]])
+            except ValueError:
+                print(f"Skipping line in {file_path}: {line.strip()}")
+        values = np.array(rows, dtype=np.float64)
+    values = values.reshape(-1, LABEL_COLUMNS)
+
+    boxes = np.empty(len(values), dtype=BOX_DTYPE)
+    boxes['frame'] = values[:, 0]
+    boxes['class_id'] = values[:, 1]
+    boxes['x_center'] = values[:, 2]
+    boxes['y_center'] = values[:, 3]
+    boxes['width'] = values[:, 4]
+    boxes['height'] = values[:, 5]
+    boxes['confidence'] = values[:, 6]
+    boxes['vehicle_id'] = vehicle_id
+    return boxes
+
+
+def parse_label_files(label_files, workers=None):
+    # label_files: [(vehicle_id, path)], parsed in a process pool when there are many of them
+    if len(label_files) < PARALLEL_MIN_FILES or workers == 1:
+        return [parse_label_file(path, vehicle_id) for vehicle_id, path in label_files]
+    workers = workers or os.cpu_count() or 1
+    vehicle_ids = [vehicle_id for vehicle_id, _ in label_files]
+    paths = [path for _, path in label_files]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(label_files) // (workers * 8))
+        return list(executor.map(parse_label_file, paths, vehicle_ids, chunksize=chunksize))
+
+
+def list_label_files(labels_dir):
+    # {vehicle_id: (path, size, mtime_ns)}, scandir gets the stats without extra system calls on Windows
+    label_files = {}
+    with os.scandir(labels_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.txt') or not entry.is_file():
+                continue
+            try:
+                # vehicle_id is the name of the txt file without the extension
+                vehicle_id = int(entry.name.split('.')[0])
+            except ValueError:
+                print(f"Skipping label file {entry.name}: name is not a vehicle id")
+                continue
+            stat = entry.stat()
+            label_files[vehicle_id] = (entry.path, stat.st_size, stat.st_mtime_ns)
+    return label_files
+
+
+def remove_old_generations(cache_dir, current):
+    # older generations (and files of the flat cache layout) that are still mapped are left for the next save
+    for entry in os.scandir(cache_dir):
+        if entry.name in (current, CACHE_POINTER_NAME):
+            continue
+        try:
+            if entry.is_dir():
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class LabelStore:
+    # Columnar store of all bounding boxes sorted by frame, with two offset indexes:
+    #   frame_offsets[f]:frame_offsets[f + 1]      rows of boxes in frame f
+    #   vehicle_offsets[v]:vehicle_offsets[v + 1]  frames of vehicle v in vehicle_frames
+    def __init__(self, boxes, frame_offsets, vehicle_frames, vehicle_offsets):
+        self.boxes = boxes
+        self.frame_offsets = frame_offsets
+        self.vehicle_frames = vehicle_frames
+        self.vehicle_offsets = vehicle_offsets
+        self.ingest_stats = None
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @classmethod
+    def empty(cls):
+        return cls.from_boxes(np.empty(0, dtype=BOX_DTYPE))
+
+    @classmethod
+    def from_boxes(cls, boxes):
+        boxes = boxes[np.argsort(boxes['frame'], kind='stable')]
+        max_frame = int(boxes['frame'].max()) if len(boxes) else -1
+        frame_offsets = np.searchsorted(boxes['frame'], np.arange(max_frame + 2)).astype(np.int64)
+
+        by_vehicle = np.argsort(boxes['vehicle_id'], kind='stable')
+        vehicle_ids = boxes['vehicle_id'][by_vehicle]
+        vehicle_frames = boxes['frame'][by_vehicle]
+        max_vehicle = int(vehicle_ids.max()) if len(boxes) else -1
+        vehicle_offsets = np.searchsorted(vehicle_ids, np.arange(max_vehicle + 2)).astype(np.int64)
+        return cls(boxes, frame_offsets, vehicle_frames, vehicle_offsets)
+
+    @classmethod
+    def open(cls, labels_dir, workers=None):
+        # Reuse the binary cache and re-parse only label files whose size or mtime changed since it was built
+        started = time.perf_counter()
+        cache_dir = os.path.join(labels_dir, CACHE_DIR_NAME)
+        label_files = list_label_files(labels_dir)
+        manifest = np.array([(vehicle_id, size, mtime_ns) for vehicle_id, (_, size, mtime_ns) in label_files.items()],
+                            dtype=MANIFEST_DTYPE)
+        manifest.sort(order='vehicle_id')
+
+        cached = cls.load(cache_dir)
+        if cached is not None:
+            store, cached_manifest = cached
+            if np.array_equal(cached_manifest, manifest):
+                store.ingest_stats = cls.ingest_stats_of(0, 0, time.perf_counter() - started)
+                print(f"Labels loaded from cache: {len(store)} bounding boxes")
+                return store
+            unchanged = np.intersect1d(cached_manifest, manifest)['vehicle_id']
+            kept = [np.asarray(store.boxes[np.isin(store.boxes['vehicle_id'], unchanged)])]
+        else:
+            unchanged = np.empty(0, dtype=np.int32)
+            kept = []
+
+        changed = [(int(vehicle_id), label_files[vehicle_id][0])
+                   for vehicle_id in np.setdiff1d(manifest['vehicle_id'], unchanged)]
+        parsed = parse_label_files(changed, workers)
+        boxes = np.concatenate(kept + parsed) if kept or parsed else np.empty(0, dtype=BOX_DTYPE)
+        store = cls.from_boxes(boxes)
+        store.ingest_stats = cls.ingest_stats_of(len(changed), sum(len(p) for p in parsed),
+                                                 time.perf_counter() - started)
+        print(f"Labels parsed: {len(changed)} of {len(label_files)} files changed, {len(store)} bounding boxes, "
+              f"{store.ingest_stats['files_per_s']:.0f} files/s, {store.ingest_stats['boxes_per_s']:.0f} boxes/s")
+        store.save(cache_dir, manifest)
+        return store
+
+    @staticmethod
+    def ingest_stats_of(files, boxes, seconds):
+        return {
+            'files': files,
+            'boxes': boxes,
+            'seconds': seconds,
+            'files_per_s': files / seconds if seconds > 0 else 0.0,
+            'boxes_per_s': boxes / seconds if seconds > 0 else 0.0,
+        }
+
+    @classmethod
+    def load(cls, cache_dir):
+        try:
+            with open(os.path.join(cache_dir, CACHE_POINTER_NAME), 'r') as f:
+                generation_dir = os.path.join(cache_dir, f.read().strip())
+            manifest = np.load(os.path.join(generation_dir, "manifest.npy"))
+            arrays = [np.load(os.path.join(generation_dir, f"{name}.npy"), mmap_mode='r') for name in CACHE_ARRAYS]
+        except (OSError, ValueError):
+            return None
+        if manifest.dtype != MANIFEST_DTYPE:
+            return None
+        return cls(*arrays), manifest
+
+    def save(self, cache_dir, manifest):
+        # Every build is written to a new generation directory and the pointer file is switched to it.
+        # Files of the previous generation stay untouched, stores opened from them (the widget's, the one
+        # just merged) keep them memory-mapped and Windows cannot replace or delete mapped files.
+        generation = f"generation_{time.time_ns()}"
+        try:
+            generation_dir = os.path.join(cache_dir, generation)
+            os.makedirs(generation_dir)
+            for name in CACHE_ARRAYS + ("manifest",):
+                np.save(os.path.join(generation_dir, f"{name}.npy"), manifest if name == "manifest" else getattr(self, name))
+            pointer_path = os.path.join(cache_dir, CACHE_POINTER_NAME)
+            with open(pointer_path + ".tmp", 'w') as f:
+                f.write(generation)
+            os.replace(pointer_path + ".tmp", pointer_path)
+        except OSError as e:
+            print(f"Could not save label cache to {cache_dir}: {e}")
+            return
+        remove_old_generations(cache_dir, generation)
+
+    def boxes_in_frame(self, frame_index):
+        if frame_index < 0 or frame_index + 1 >= len(self.frame_offsets):
+            return self.boxes[:0]
+        return self.boxes[self.frame_offsets[frame_index]:self.frame_offsets[frame_index + 1]]
+
+    def frames_of_vehicle(self, vehicle_id):
+        if vehicle_id < 0 or vehicle_id + 1 >= len(self.vehicle_offsets):
+            return self.vehicle_frames[:0]
+        return self.vehicle_frames[self.vehicle_offsets[vehicle_id]:self.vehicle_offsets[vehicle_id + 1]]
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+from project_file import (ProjectFile, SETTINGS_SECTION, CAMERA_POINTS_SECTION, CAMERA_TRACK_SECTION, VEHICLES_SECTION,
+                          EMPTY_TEXT)
+
+# columns of the vehicles table, also the columns of VehicleTable (vehicle_table.py)
+VEHICLE_COLUMNS = (
+    ("kategorie_vozidla", "INTEGER"),
+    ("lat", "REAL"),
+    ("lon", "REAL"),
+    ("status", "TEXT"),
+    ("cas_ve_videu", "INTEGER"),
+    ("cas_realny", "INTEGER"),
+    ("typ_parkoviste", "INTEGER"),
+    ("oznaceni_parkoviste", "INTEGER"),
+    ("typ_povrchu", "INTEGER"),
+    ("vztah_k_provozu", "INTEGER"),
+    ("legalnost_parkovani", "INTEGER"),
+    ("vrak", "INTEGER"),
+    ("komentar", "TEXT"),
+    ("validovano", "TEXT"),
+    ("komentar_validace", "TEXT"),
+)
+VEHICLE_COLUMN_NAMES = tuple(name for name, _ in VEHICLE_COLUMNS)
+
+SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS settings (line_no INTEGER PRIMARY KEY, line TEXT);
+    CREATE TABLE IF NOT EXISTS arrays (name TEXT PRIMARY KEY, columns INTEGER, data BLOB);
+    CREATE TABLE IF NOT EXISTS vehicles (id INTEGER PRIMARY KEY, {", ".join(f"{name} {kind}" for name, kind in VEHICLE_COLUMNS)});
+"""
+
+
+class ProjectDatabase:
+    # Project stored in a single SQLite file (.pconf.db). Camera points and the camera track are
+    # float64 blobs, vehicles are rows, so saving one vehicle writes one row instead of the whole project.
+    # Offers the same reading methods as ProjectFile.
+    def __init__(self, path):
+        self.path = path
+        self.folder = os.path.dirname(path)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+        meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        self.name = meta.get("name", "")
+        self.description = meta.get("description", "")
+        self.video_name = meta.get("video_name", "")
+
+    def close(self):
+        self.connection.close()
+
+    def settings(self):
+        return [line for line, in self.connection.execute("SELECT line FROM settings ORDER BY line_no")]
+
+    def array(self, name):
+        row = self.connection.execute("SELECT columns, data FROM arrays WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return np.zeros((0, 2))
+        columns, data = row
+        return np.frombuffer(data, dtype=np.float64).reshape(-1, columns)
+
+    def camera_points(self):
+        return self.array(CAMERA_POINTS_SECTION)
+
+    def camera_track(self):
+        return self.array(CAMERA_TRACK_SECTION)
+
+    def vehicles(self):
+        rows = self.connection.execute(f"SELECT id, {', '.join(VEHICLE_COLUMN_NAMES)} FROM vehicles ORDER BY id")
+        return {row[0]: list(row[1:]) for row in rows}
+
+    def update_vehicle(self, id, **values):
+        # e.g. update_vehicle(12, status="disabled"), only the given columns of one row are written
+        columns = [name for name in values if name in VEHICLE_COLUMN_NAMES]
+        if not columns:
+            return
+        with self.connection:
+            self.connection.execute(f"UPDATE vehicles SET {', '.join(f'{name} = ?' for name in columns)} WHERE id = ?",
+                                    [values[name] for name in columns] + [id])
+
+    def save_vehicles(self, vehicles):
+        # {id: [15 values]}, inserts or replaces only the given vehicles
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO vehicles (id, {', '.join(VEHICLE_COLUMN_NAMES)}) "
+                f"VALUES ({', '.join('?' * (len(VEHICLE_COLUMN_NAMES) + 1))})",
+                ([id] + list(data) for id, data in vehicles.items()))
+
+    def save_array(self, name, array):
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO arrays (name, columns, data) VALUES (?, ?, ?)",
+                                    (name, array.shape[1] if array.ndim == 2 else 1, array.tobytes()))
+
+    @classmethod
+    def import_pconf(cls, pconf_path, db_path=None):
+        # .pconf.txt -> .pconf.db (next to the text file unless db_path is given)
+        db_path = db_path or pconf_path[:-len(".txt")] + ".db"
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        source = ProjectFile(pconf_path)
+        project = cls(db_path)
+        with project.connection:
+            project.connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("name", source.name), ("description", source.description), ("video_name", source.video_name)])
+            project.connection.executemany("INSERT INTO settings (line_no, line) VALUES (?, ?)",
+                                           enumerate(source.settings()))
+        project.name, project.description, project.video_name = source.name, source.description, source.video_name
+        project.save_array(CAMERA_POINTS_SECTION, source.camera_points())
+        project.save_array(CAMERA_TRACK_SECTION, source.camera_track())
+        project.save_vehicles(source.vehicles())
+        return project
+
+    def export_pconf(self, pconf_path):
+        # .pconf.db -> .pconf.txt in the format read by ProjectFile, ValueError if a text value has whitespace
+        vehicle_lines = [" ".join([str(id)] + [format_vehicle_value(id, value) for value in data]) + "\n"
+                         for id, data in self.vehicles().items()]
+        with open(pconf_path + ".tmp", 'w', encoding='utf-8') as file:
+            file.write(f"{self.name}\n{self.description}\n{self.video_name}\n")
+            file.write(f">--- {SETTINGS_SECTION}\n")
+            file.writelines(f"{line}\n" for line in self.settings())
+            file.write("*KONEC\n")
+            for section in (CAMERA_POINTS_SECTION, CAMERA_TRACK_SECTION):
+                file.write(f">--- {section}\n")
+                file.writelines(f"{lat!r} {lon!r}\n" for lat, lon in self.array(section).tolist())
+                file.write("*KONEC\n")
+            file.write(f">--- {VEHICLES_SECTION}\n")
+            file.writelines(vehicle_lines)
+            file.write("*KONEC\n")
+        os.replace(pconf_path + ".tmp", pconf_path)
+
+
+def format_vehicle_value(id, value):
+    if isinstance(value, float):
+        return repr(value)
+    value = str(value)
+    if value == "":
+        return EMPTY_TEXT
+    if len(value.split()) != 1 or value != value.strip():
+        raise ValueError(f"Vehicle {id}: value {value!r} cannot be saved to .pconf.txt (whitespace)")
+    return value
+
+
+def open_project(path):
+    if path.endswith(".pconf.db"):
+        return ProjectDatabase(path)
+    return ProjectFile(path)
+
+
+if __name__ == "__main__":
+    # python project_db.py import <project.pconf.txt> [project.pconf.db]
+    # python project_db.py export <project.pconf.db> <project.pconf.txt>
+    if len(sys.argv) >= 3 and sys.argv[1] == "import":
+        ProjectDatabase.import_pconf(sys.argv[2], *sys.argv[3:4]).close()
+    elif len(sys.argv) >= 4 and sys.argv[1] == "export":
+        project = ProjectDatabase(sys.argv[2])
+        project.export_pconf(sys.argv[3])
+        project.close()
+    else:
+        print("Usage: python project_db.py import <project.pconf.txt> [project.pconf.db]\n"
+              "       python project_db.py export <project.pconf.db> <project.pconf.txt>")
+        sys.exit(1)
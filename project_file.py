@@ -0,0 +1,100 @@
+import mmap
+import os
+
+import numpy as np
+
+# .pconf.txt: name, description and video file on the first three lines, then sections
+#   >--- <Section name>
+#   ...
+#   *KONEC
+SECTION_START = b">--- "
+SECTION_END = b"*KONEC"
+
+SETTINGS_SECTION = "Nastaveni"
+CAMERA_POINTS_SECTION = "Body Kamery"
+CAMERA_TRACK_SECTION = "Cesta Kamery"
+VEHICLES_SECTION = "Detekce Objektu"
+
+VEHICLE_FIELD_COUNT = 16  # id + 15 values in the order of VEHICLE_COLUMNS (project_db.py)
+EMPTY_TEXT = "-"  # stands for an empty text value, vehicle lines are split on whitespace
+
+
+def text_value(part):
+    return "" if part == EMPTY_TEXT else part
+
+
+def parse_vehicle(parts):
+    return [int(parts[1]), float(parts[2]), float(parts[3]), text_value(parts[4]), int(parts[5]), int(parts[6]),
+            int(parts[7]), int(parts[8]), int(parts[9]), int(parts[10]), int(parts[11]), int(parts[12]),
+            text_value(parts[13]), text_value(parts[14]), text_value(parts[15])]
+
+
+class ProjectFile:
+    # Reader of a .pconf.txt project. Opening finds where every section starts and ends with one
+    # search over the memory-mapped file, the sections are parsed only when they are asked for.
+    def __init__(self, path):
+        self.path = path
+        self.folder = os.path.dirname(path)
+        self.sections = {}
+
+        with open(path, 'rb') as file:
+            self.name = file.readline().decode('utf-8').strip()
+            self.description = file.readline().decode('utf-8').strip()
+            self.video_name = file.readline().decode('utf-8').strip()
+            header_end = file.tell()
+            if os.fstat(file.fileno()).st_size > header_end:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    self.index_sections(data, header_end)
+
+    def index_sections(self, data, position):
+        # sections[name] = (offset of the first data line, offset of the *KONEC line)
+        while True:
+            start = data.find(SECTION_START, position)
+            if start < 0:
+                break
+            if start > 0 and data[start - 1:start] != b"\n":
+                position = start + 1
+                continue
+            line_end = data.find(b"\n", start)
+            if line_end < 0:
+                line_end = len(data)
+            name = data[start + len(SECTION_START):line_end].decode('utf-8').strip()
+            end = data.find(b"\n" + SECTION_END, line_end)
+            end = len(data) if end < 0 else end + 1
+            self.sections[name] = (min(line_end + 1, len(data)), end)
+            position = end
+
+    def section_text(self, name):
+        if name not in self.sections:
+            return ""
+        start, end = self.sections[name]
+        with open(self.path, 'rb') as file:
+            file.seek(start)
+            return file.read(end - start).decode('utf-8')
+
+    def section_array(self, name, columns):
+        # numeric section in one NumPy call
+        values = np.fromstring(self.section_text(name), dtype=np.float64, sep=' ')
+        return values[:len(values) - len(values) % columns].reshape(-1, columns)
+
+    def settings(self):
+        # TODO: načíst nastavení (zatím jen řádky sekce)
+        return self.section_text(SETTINGS_SECTION).splitlines()
+
+    def camera_points(self):
+        return self.section_array(CAMERA_POINTS_SECTION, 2)
+
+    def camera_track(self):
+        return self.section_array(CAMERA_TRACK_SECTION, 2)
+
+    def vehicles(self):
+        # {id: [kategorie_vozidla, lat, lon, status, cas_ve_videu, cas_realny, typ_parkoviste, oznaceni_parkoviste,
+        #       typ_povrchu, vztah_k_provozu, legalnost_parkovani, vrak, komentar, validovano, komentar_validace]}
+        vehicles = {}
+        for line in self.section_text(VEHICLES_SECTION).splitlines():
+            parts = line.split()
+            if len(parts) >= VEHICLE_FIELD_COUNT:
+                vehicles[int(parts[0])] = parse_vehicle(parts)
+            elif parts:
+                print(f"Skipping vehicle line with {len(parts)} of {VEHICLE_FIELD_COUNT} values: {line}")
+        return vehicles
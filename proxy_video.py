@@ -0,0 +1,265 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import cv2  # install opencv-python
+
+# Proxy of a survey video for playback: small MJPG frames (every frame is a keyframe, so any frame can
+# be decoded on its own) in segment files <proxy_dir>/<video>.proxy/segment_NNNNN.avi, described by
+# manifest.npz in the same folder. Segments are transcoded in parallel in a process pool.
+# Disk cost: every frame is a full JPEG, at 960x540 and quality 75 about 50-80 KB per frame of road
+# footage, i.e. roughly 5-9 GB per hour of 30 fps video (twice that for 60 fps) next to the project.
+PROXY_MAX_WIDTH = 960
+PROXY_MAX_HEIGHT = 540
+PROXY_QUALITY = 75
+SEGMENT_SECONDS = 30
+# two cores are left to the playback decoder and the GUI while a proxy is being built
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) - 2)
+MANIFEST_NAME = "manifest.npz"
+
+
+def proxy_folder(video_path, proxy_dir):
+    return os.path.join(proxy_dir, os.path.basename(video_path) + ".proxy")
+
+
+def segment_path(folder, segment):
+    return os.path.join(folder, f"segment_{segment:05d}.avi")
+
+
+def is_proxy(path):
+    return os.path.basename(path) == MANIFEST_NAME
+
+
+def read_manifest(manifest_path):
+    with np.load(manifest_path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def find_proxy(video_path, proxy_dir):
+    # manifest of a finished proxy made from the current version of the video, None otherwise
+    manifest_path = os.path.join(proxy_folder(video_path, proxy_dir), MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        manifest = read_manifest(manifest_path)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Proxy {manifest_path} is unreadable: {e}")
+        return None
+    stat = os.stat(video_path)
+    if (not manifest["complete"] or int(manifest["source_size"]) != stat.st_size
+            or int(manifest["source_mtime"]) != int(stat.st_mtime)):
+        return None
+    return manifest_path
+
+
+def proxy_size(width, height):
+    scale = min(1.0, PROXY_MAX_WIDTH / width, PROXY_MAX_HEIGHT / height)
+    # MJPG works on 8x8 blocks, even sizes are also needed by most players
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def transcode_segment(video_path, output_path, start, count, fps, size):
+    # runs in a worker process, frames start .. start + count - 1 of the video into one segment file
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    writer = cv2.VideoWriter(output_path + ".tmp.avi", cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    writer.set(cv2.VIDEOWRITER_PROP_QUALITY, PROXY_QUALITY)
+    written = 0
+    while written < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        writer.write(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+        written += 1
+    writer.release()
+    cap.release()
+    os.replace(output_path + ".tmp.avi", output_path)
+    return written
+
+
+class ProxyBuild:
+    # Transcodes the segments of a proxy in a process pool without blocking the caller.
+    # Segments finished by an earlier, interrupted build of the same video are kept.
+    def __init__(self, video_path, proxy_dir, workers=DEFAULT_WORKERS):
+        self.video_path = video_path
+        self.folder = proxy_folder(video_path, proxy_dir)
+        self.manifest_path = os.path.join(self.folder, MANIFEST_NAME)
+        self.started = time.perf_counter()
+        os.makedirs(self.folder, exist_ok=True)
+
+        cap = cv2.VideoCapture(video_path)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.size = proxy_size(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+        segment_frames = max(1, int(round(self.fps * SEGMENT_SECONDS)))
+        self.segment_starts = np.arange(0, frame_count, segment_frames, dtype=np.int64)
+        self.segment_counts = np.diff(np.append(self.segment_starts, frame_count))
+
+        stat = os.stat(video_path)
+        self.source = (stat.st_size, int(stat.st_mtime))
+        reuse = self.matches_previous_build()
+        self.write_manifest(complete=False)
+
+        self.executor = ProcessPoolExecutor(workers)
+        self.futures = []
+        for segment, (start, count) in enumerate(zip(self.segment_starts.tolist(), self.segment_counts.tolist())):
+            path = segment_path(self.folder, segment)
+            if reuse and os.path.exists(path):
+                continue
+            self.futures.append(self.executor.submit(transcode_segment, video_path, path, start, count, self.fps, self.size))
+        print(f"Building proxy of {video_path}: {len(self.futures)} of {len(self.segment_starts)} segments "
+              f"at {self.size[0]}x{self.size[1]} with {workers} workers")
+
+    def matches_previous_build(self):
+        if not os.path.exists(self.manifest_path):
+            return False
+        try:
+            manifest = read_manifest(self.manifest_path)
+        except (OSError, KeyError, ValueError):
+            return False
+        return ((int(manifest["source_size"]), int(manifest["source_mtime"])) == self.source
+                and np.array_equal(manifest["segment_starts"], self.segment_starts)
+                and tuple(manifest["size"]) == self.size)
+
+    def write_manifest(self, complete, segment_counts=None):
+        counts = self.segment_counts if segment_counts is None else segment_counts
+        with open(self.manifest_path + ".tmp", 'wb') as file:
+            np.savez(file, segment_starts=self.segment_starts, segment_counts=counts,
+                     frame_count=int(counts.sum()), fps=self.fps, size=np.array(self.size),
+                     source_size=self.source[0], source_mtime=self.source[1], complete=complete)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def progress(self):
+        done = len(self.segment_starts) - len(self.futures) + sum(future.done() for future in self.futures)
+        return done / max(1, len(self.segment_starts))
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def finish(self):
+        # after done(): marks the proxy complete, returns the manifest path or None if a segment failed
+        self.executor.shutdown(wait=True)
+        try:
+            for future in self.futures:
+                future.result()
+        except Exception as e:
+            print(f"Proxy of {self.video_path} failed: {e}")
+            return None
+        # Proxy positions have to stay the frame numbers of the original (labels, zoom), so every segment has
+        # to start at its planned frame: only the last one may be shorter (the frame count reported by
+        # the container can be off), a short segment in the middle fails the build and is transcoded again
+        # next time.
+        counts = np.array([int(cv2.VideoCapture(segment_path(self.folder, segment), cv2.CAP_OPENCV_MJPEG).get(cv2.CAP_PROP_FRAME_COUNT))
+                           for segment in range(len(self.segment_starts))], dtype=np.int64)
+        short = np.flatnonzero(counts[:-1] != self.segment_counts[:-1])
+        if len(short) or (len(counts) and counts[-1] > self.segment_counts[-1]):
+            for segment in short.tolist():
+                os.remove(segment_path(self.folder, segment))
+            print(f"Proxy of {self.video_path} failed: segments {short.tolist()} have {counts[short].tolist()} "
+                  f"instead of {self.segment_counts[short].tolist()} frames")
+            return None
+        self.write_manifest(complete=True, segment_counts=counts)
+        print(f"Proxy of {self.video_path} built in {time.perf_counter() - self.started:.1f} s")
+        return self.manifest_path
+
+    def cancel(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SegmentedCapture:
+    # Reads a proxy like a cv2.VideoCapture (the part of it FrameDecoder and SeekEngine use),
+    # positions are counted over all segments
+    def __init__(self, manifest_path):
+        manifest = read_manifest(manifest_path)
+        self.folder = os.path.dirname(manifest_path)
+        self.segment_starts = manifest["segment_starts"]
+        self.frame_count = int(manifest["frame_count"])
+        self.fps = float(manifest["fps"])
+        self.size = tuple(int(value) for value in manifest["size"])
+        self.segment = None
+        self.cap = None
+        self.position = 0
+        if self.frame_count > 0:
+            self.open_segment(0)
+
+    def open_segment(self, segment):
+        if self.cap is not None:
+            self.cap.release()
+        # OpenCV's own MJPEG reader seeks by the AVI index, a jump costs one JPEG decode
+        self.cap = cv2.VideoCapture(segment_path(self.folder, segment), cv2.CAP_OPENCV_MJPEG)
+        self.segment = segment
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES or self.frame_count == 0:
+            return False
+        position = int(min(max(value, 0), self.frame_count))
+        segment = int(np.searchsorted(self.segment_starts, position, side="right")) - 1
+        if segment != self.segment:
+            self.open_segment(segment)
+        self.position = position
+        return self.cap.set(cv2.CAP_PROP_POS_FRAMES, position - int(self.segment_starts[segment]))
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.size[0]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.size[1]
+        return self.cap.get(prop) if self.cap is not None else 0
+
+    def next_segment(self):
+        # at the end of a segment the next one is opened
+        if self.position >= self.frame_count:
+            return False
+        if self.segment + 1 < len(self.segment_starts) and self.position >= self.segment_starts[self.segment + 1]:
+            self.open_segment(self.segment + 1)
+        return True
+
+    def grab(self):
+        if not self.next_segment() or not self.cap.grab():
+            return False
+        self.position += 1
+        return True
+
+    def read(self):
+        if not self.next_segment():
+            return False, None
+        ret, frame = self.cap.read()
+        if ret:
+            self.position += 1
+        return ret, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+def open_capture(path):
+    if is_proxy(path):
+        return SegmentedCapture(path)
+    return cv2.VideoCapture(path)
+
+
+if __name__ == "__main__":
+    # python proxy_video.py <video> [proxy_dir]
+    if len(sys.argv) < 2:
+        print("Usage: python proxy_video.py <video> [proxy_dir]")
+        sys.exit(1)
+    video = sys.argv[1]
+    build = ProxyBuild(video, sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(video), ".proxy"))
+    while not build.done():
+        print(f"{build.progress() * 100:.0f} %")
+        time.sleep(1)
+    build.finish()
@@ -0,0 +1,86 @@
+import numpy as np
+
+from camera_track import EARTH_RADIUS
+
+# Zoom levels of the map (min_zoom 16, max_zoom 19). Below DETAIL_ZOOM the route is drawn simplified
+# so that the error stays under one pixel, from DETAIL_ZOOM on the full resolution route is sent
+# only for the visible part of the map.
+LOD_ZOOMS = (16, 17, 18)
+DETAIL_ZOOM = 19
+MAX_DETAIL_POINTS = 20000
+
+
+def douglas_peucker(x, y, tolerance):
+    # Indices of the points kept by Douglas-Peucker simplification, iterative so long routes do not
+    # hit the recursion limit. Distances of all points of a segment are computed at once.
+    count = len(x)
+    if count < 3:
+        return np.arange(count)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(px * dy - py * dx) / length
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def meters_per_pixel(lat, zoom):
+    return 2 * np.pi * EARTH_RADIUS * np.cos(np.radians(lat)) / (256 * 2 ** zoom)
+
+
+class RouteLevels:
+    # Route simplified once for every zoom level in LOD_ZOOMS, plus the full route for viewport queries
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.lat = points[:, 0]
+        self.lon = points[:, 1]
+        self.levels = {}
+        if len(points) == 0:
+            return
+
+        lat0 = np.radians(self.lat.mean())
+        x = np.radians(self.lon) * np.cos(lat0) * EARTH_RADIUS
+        y = np.radians(self.lat) * EARTH_RADIUS
+        # from the finest level to the coarsest, each level simplifies the previous one
+        indices = np.arange(len(points))
+        for zoom in sorted(LOD_ZOOMS, reverse=True):
+            indices = indices[douglas_peucker(x[indices], y[indices], meters_per_pixel(np.degrees(lat0), zoom))]
+            self.levels[zoom] = indices
+
+    def __len__(self):
+        return len(self.lat)
+
+    def flat(self, indices):
+        # [lat, lon, lat, lon, ...] rounded to ~1 cm, compact enough to send to the map as JSON
+        return np.round(np.column_stack((self.lat[indices], self.lon[indices])).ravel(), 7).tolist()
+
+    def level_arrays(self):
+        return {zoom: self.flat(indices) for zoom, indices in self.levels.items()}
+
+    def detail_in_bounds(self, south, west, north, east):
+        # Full resolution parts of the route inside the bounds, one flat array per continuous part.
+        # The neighbouring point on each side is included so the parts connect to the edge of the map.
+        inside = (self.lat >= south) & (self.lat <= north) & (self.lon >= west) & (self.lon <= east)
+        near = inside.copy()
+        near[:-1] |= inside[1:]
+        near[1:] |= inside[:-1]
+        indices = np.flatnonzero(near)
+        parts = np.split(indices, np.flatnonzero(np.diff(indices) > 1) + 1)
+        step = max(1, int(np.ceil(len(indices) / MAX_DETAIL_POINTS)))
+        # when thinned, keep the last point of every part so it still ends where it should
+        return [self.flat(np.append(part[:-1:step], part[-1])) for part in parts if len(part) > 1]
@@ -0,0 +1,137 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import cv2  # install opencv-python
+
+
+class KeyframeIndex:
+    # Positions of keyframes in the video, stored next to the video as <video>.keyframes.npz
+    def __init__(self, keyframes=None):
+        self.keyframes = np.asarray(keyframes if keyframes is not None else [], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keyframes)
+
+    @staticmethod
+    def sidecar_path(video_path):
+        return video_path + ".keyframes.npz"
+
+    @classmethod
+    def load_or_build(cls, video_path):
+        index_path = cls.sidecar_path(video_path)
+        stat = os.stat(video_path)
+        if os.path.exists(index_path):
+            try:
+                with np.load(index_path) as data:
+                    if int(data["video_size"]) == stat.st_size and int(data["video_mtime"]) == int(stat.st_mtime):
+                        return cls(data["keyframes"])
+            except (OSError, KeyError, ValueError) as e:
+                print(f"Keyframe index {index_path} is unreadable, rebuilding: {e}")
+
+        index = cls.build(video_path)
+        try:
+            np.savez(index_path, keyframes=index.keyframes, video_size=stat.st_size, video_mtime=int(stat.st_mtime))
+        except OSError as e:
+            print(f"Could not save keyframe index {index_path}: {e}")
+        return index
+
+    @classmethod
+    def build(cls, video_path):
+        # Read the raw packets without decoding them and remember which ones are keyframes.
+        # For closed GOPs the packet number of a keyframe equals its frame number.
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+        keyframes = []
+        packet = 0
+        while cap.isOpened() and cap.grab():
+            if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframes.append(packet)
+            packet += 1
+        cap.release()
+        print(f"Keyframe index built: {len(keyframes)} keyframes in {packet} frames")
+        return cls(keyframes)
+
+    def keyframe_before(self, position):
+        i = np.searchsorted(self.keyframes, position, side="right") - 1
+        if i < 0:
+            return None
+        return int(self.keyframes[i])
+
+
+class GopCache:
+    # Small LRU cache of already converted frames grouped by the GOP they belong to
+    def __init__(self, max_frames=240):
+        self.max_frames = max_frames
+        self.gops = OrderedDict()
+        self.frame_count = 0
+        self.lock = threading.Lock()
+
+    def get(self, gop, frame_index):
+        with self.lock:
+            frames = self.gops.get(gop)
+            if frames is None or frame_index not in frames:
+                return None
+            self.gops.move_to_end(gop)
+            return frames[frame_index]
+
+    def put(self, gop, frame_index, frame):
+        with self.lock:
+            frames = self.gops.setdefault(gop, {})
+            self.gops.move_to_end(gop)
+            if frame_index not in frames:
+                self.frame_count += 1
+            frames[frame_index] = frame
+            while self.frame_count > self.max_frames and len(self.gops) > 1:
+                _, evicted = self.gops.popitem(last=False)
+                self.frame_count -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.gops.clear()
+            self.frame_count = 0
+
+
+class SeekEngine:
+    # Positions a cv2.VideoCapture using the keyframe index: short jumps forward inside the
+    # current GOP are decoded forward, longer jumps start at the nearest keyframe.
+    def __init__(self, cap, keyframe_index=None, cache_frames=240, forward_decode_limit=90):
+        self.cap = cap
+        self.keyframe_index = keyframe_index or KeyframeIndex()
+        self.cache = GopCache(cache_frames)
+        self.forward_decode_limit = forward_decode_limit
+        self.position = 0  # position of the frame the next read() returns
+
+    def gop_of(self, position):
+        keyframe = self.keyframe_index.keyframe_before(position)
+        if keyframe is None:
+            return position // self.forward_decode_limit
+        return keyframe
+
+    def seek(self, position):
+        if position == self.position:
+            return
+        keyframe = self.keyframe_index.keyframe_before(position)
+        if self.position < position and (position - self.position <= self.forward_decode_limit
+                                         or (keyframe is not None and keyframe <= self.position)):
+            self.skip(position - self.position)
+        elif keyframe is not None:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            self.position = keyframe
+            self.skip(position - keyframe)
+        else:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            self.position = position
+
+    def skip(self, count):
+        # grab() decodes without converting the frame, which is all we need to move forward
+        for _ in range(count):
+            if not self.cap.grab():
+                break
+            self.position += 1
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if ret:
+            self.position += 1
+        return ret, frame
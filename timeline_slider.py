@@ -0,0 +1,79 @@
+import numpy as np
+from PyQt5.QtWidgets import QSlider
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtCore import Qt
+
+HIGHLIGHT_COLOR = (71, 187, 237)
+HIGHLIGHT_HEIGHT = 8
+# colours of detections by the status of their vehicle (tbd, done, disabled), like the markers in the map
+STATUS_COLORS = ((255, 0, 0), (0, 128, 0), (160, 160, 160))
+DENSITY_HEIGHT = 4
+
+
+class TimelineSlider(QSlider):
+    # Slider over the whole video with a bitmap drawn under it: frames of the selected vehicle at the top,
+    # detections of the whole video at the bottom (more detections = more opaque, coloured by the status
+    # of their vehicles). The bitmap has one column per pixel of the slider and is rendered only when
+    # the data or the width changes, repaints just draw it.
+    def __init__(self, parent=None):
+        super().__init__(Qt.Horizontal, parent)
+        self.highlighted_frames = np.empty(0, dtype=np.int64)
+        self.status_counts = np.zeros((0, len(STATUS_COLORS)), dtype=np.int64)  # detections per frame and status
+        self.bitmap = None  # (QImage, its pixels)
+        self.rangeChanged.connect(lambda minimum, maximum: self.invalidate())
+
+    def set_highlighted_frames(self, frames):
+        self.highlighted_frames = np.asarray(frames, dtype=np.int64)
+        self.invalidate()
+
+    def set_status_counts(self, counts):
+        self.status_counts = counts
+        self.invalidate()
+
+    def move_status_counts(self, frames, old_status, new_status):
+        # one detection in each of the frames changed its status (a vehicle was saved), no recount
+        np.subtract.at(self.status_counts[:, old_status], frames, 1)
+        np.add.at(self.status_counts[:, new_status], frames, 1)
+        self.invalidate()
+
+    def invalidate(self):
+        self.bitmap = None
+        self.update()
+
+    def columns_of(self, frames):
+        width = max(1, self.width())
+        return np.clip((frames / max(1, self.maximum()) * width).astype(np.int64), 0, width - 1)
+
+    def render_bitmap(self):
+        width, height = max(1, self.width()), max(1, self.height())
+        pixels = np.zeros((height, width, 4), dtype=np.uint8)  # BGRA, transparent
+
+        if len(self.highlighted_frames):
+            # marks 3 pixels wide
+            marked = np.zeros(width + 2, dtype=bool)
+            marked[self.columns_of(self.highlighted_frames) + 1] = True
+            marked = marked[:-2] | marked[1:-1] | marked[2:]
+            pixels[:HIGHLIGHT_HEIGHT, marked] = HIGHLIGHT_COLOR[::-1] + (255,)
+
+        if len(self.status_counts):
+            columns = self.columns_of(np.arange(len(self.status_counts)))
+            counts = np.column_stack([np.bincount(columns, weights=self.status_counts[:, status], minlength=width)
+                                      for status in range(self.status_counts.shape[1])])
+            total = counts.sum(axis=1)
+            if total.max() > 0:
+                shares = counts / np.maximum(total, 1)[:, None]
+                colors = shares @ np.array(STATUS_COLORS, dtype=np.float64)
+                pixels[-DENSITY_HEIGHT:, :, :3] = colors[:, ::-1].astype(np.uint8)
+                # square root so sparse parts of the video stay visible next to dense ones
+                pixels[-DENSITY_HEIGHT:, :, 3] = (255 * np.sqrt(total / total.max())).astype(np.uint8)
+
+        self.bitmap = (QImage(pixels.data, width, height, width * 4, QImage.Format_ARGB32), pixels)
+
+    def paintEvent(self, event):
+        if self.bitmap is None or self.bitmap[1].shape[:2] != (max(1, self.height()), max(1, self.width())):
+            self.render_bitmap()
+        painter = QPainter(self)
+        painter.drawImage(0, 0, self.bitmap[0])
+        painter.end()
+
+        super().paintEvent(event)  # Draw the default slider on top of the timeline
@@ -0,0 +1,264 @@
+import numpy as np
+
+from project_db import VEHICLE_COLUMN_NAMES
+
+# statuses with fixed codes (the codes of markers in the map), other statuses get the next free codes
+STATUSES = ("tbd", "done", "disabled")
+
+# columns of final_output.txt lines after the id
+OUTPUT_COLUMNS = ("kategorie_vozidla", "lat", "lon", "status")
+
+# columns stored as small codes into a list of the distinct values
+CATEGORICAL_COLUMNS = ("kategorie_vozidla", "status", "validovano")
+TEXT_COLUMNS = ("komentar", "komentar_validace")
+
+VEHICLE_DTYPE = np.dtype([
+    ('id', np.int32),
+    ('kategorie_vozidla', np.int16),
+    ('lat', np.float64),
+    ('lon', np.float64),
+    ('status', np.int8),
+    ('cas_ve_videu', np.int64),
+    ('cas_realny', np.int64),
+    ('typ_parkoviste', np.int32),
+    ('oznaceni_parkoviste', np.int32),
+    ('typ_povrchu', np.int32),
+    ('vztah_k_provozu', np.int32),
+    ('legalnost_parkovani', np.int32),
+    ('vrak', np.int32),
+    ('validovano', np.int8),
+])
+
+
+class Categories:
+    # value <-> code, a new value gets the next code
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+
+class VehicleTable:
+    # Vehicles of the survey in one NumPy structured array (a row per vehicle) with an id -> row index.
+    # Values are read and written by column name (VEHICLE_COLUMN_NAMES), whole-survey queries
+    # (next vehicle with a status, counts, vehicles in bounds) work on the columns at once.
+    def __init__(self, capacity=1024):
+        self.rows = np.zeros(capacity, dtype=VEHICLE_DTYPE)
+        self.texts = {name: np.full(capacity, "", dtype=object) for name in TEXT_COLUMNS}
+        self.categories = {name: Categories(STATUSES if name == "status" else ()) for name in CATEGORICAL_COLUMNS}
+        self.index = {}  # {id: row}
+        self.count = 0
+        self.status_counts = np.zeros(len(STATUSES) + 1, dtype=np.int64)  # vehicles per status code
+        # {key column: (rows sorted by key, rank of every row in that order, {status code: mask by rank})},
+        # built when first needed and kept up to date when a status changes
+        self.orderings = {}
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, id):
+        return id in self.index
+
+    def column(self, name):
+        # view of a column of the used rows (codes for categorical columns)
+        if name in TEXT_COLUMNS:
+            return self.texts[name][:self.count]
+        return self.rows[name][:self.count]
+
+    def ids(self):
+        return self.column('id')
+
+    def row_of(self, id):
+        # row of the vehicle, a new vehicle gets an empty row
+        row = self.index.get(id)
+        if row is None:
+            self.add_rows([id])
+            row = self.count - 1
+        return row
+
+    def add_rows(self, ids):
+        if self.count + len(ids) > len(self.rows):
+            self.grow(max(2 * len(self.rows), self.count + len(ids)))
+        start, end = self.count, self.count + len(ids)
+        self.rows[start:end] = 0
+        self.rows['id'][start:end] = ids
+        for name in CATEGORICAL_COLUMNS:
+            self.rows[name][start:end] = self.categories[name].code("")
+        for name in TEXT_COLUMNS:
+            self.texts[name][start:end] = ""
+        self.index.update(zip(ids, range(start, end)))
+        self.count = end
+        self.count_status(self.categories["status"].code(""), len(ids))
+        self.orderings.clear()
+
+    def grow(self, capacity):
+        rows = np.zeros(capacity, dtype=VEHICLE_DTYPE)
+        rows[:self.count] = self.rows[:self.count]
+        self.rows = rows
+        for name in TEXT_COLUMNS:
+            texts = np.full(capacity, "", dtype=object)
+            texts[:self.count] = self.texts[name][:self.count]
+            self.texts[name] = texts
+
+    def update_many(self, vehicles, columns=VEHICLE_COLUMN_NAMES):
+        # {id: [values in the order of columns]}, e.g. ProjectFile.vehicles() or final_output.txt with OUTPUT_COLUMNS
+        if not vehicles:
+            return
+        self.add_rows([id for id in vehicles if id not in self.index])
+        rows = np.fromiter((self.index[id] for id in vehicles), dtype=np.int64, count=len(vehicles))
+        values = list(vehicles.values())
+        for i, name in enumerate(columns):
+            column = [data[i] for data in values]
+            if name in CATEGORICAL_COLUMNS:
+                column = [self.categories[name].code(value) for value in column]
+            if name in TEXT_COLUMNS:
+                self.texts[name][rows] = column
+            else:
+                self.rows[name][rows] = column
+        if "status" in columns:
+            self.status_counts = np.bincount(self.column('status'), minlength=len(self.status_counts))
+            self.orderings.clear()
+        elif any(key in columns for key in self.orderings):
+            self.orderings.clear()
+
+    def set(self, id, **values):
+        # e.g. set(12, status="disabled", lat=50.1, lon=14.2)
+        row = self.row_of(id)
+        for name, value in values.items():
+            if name == "status":
+                self.set_status_code(row, self.categories[name].code(value))
+            elif name in CATEGORICAL_COLUMNS:
+                self.rows[name][row] = self.categories[name].code(value)
+            elif name in TEXT_COLUMNS:
+                self.texts[name][row] = value
+            else:
+                self.rows[name][row] = value
+                self.orderings.pop(name, None)
+
+    def set_status_code(self, row, code):
+        # moves the row between status buckets in O(1), counts and orderings stay valid
+        old = self.rows['status'][row]
+        if old == code:
+            return
+        self.rows['status'][row] = code
+        self.count_status(old, -1)
+        self.count_status(code, 1)
+        for order, rank, masks in self.orderings.values():
+            masks[old][rank[row]] = False
+            if code not in masks:
+                masks[code] = np.zeros(len(order), dtype=bool)
+            masks[code][rank[row]] = True
+
+    def count_status(self, code, change):
+        if code >= len(self.status_counts):
+            self.status_counts = np.append(self.status_counts, np.zeros(code + 1 - len(self.status_counts), dtype=np.int64))
+        self.status_counts[code] += change
+
+    def value(self, id, name):
+        row = self.index[id]
+        if name in CATEGORICAL_COLUMNS:
+            return self.categories[name].values[self.rows[name][row]]
+        if name in TEXT_COLUMNS:
+            return self.texts[name][row]
+        return self.rows[name][row].item()
+
+    def status(self, id):
+        return self.value(id, "status")
+
+    def get(self, id):
+        # [values in the order of VEHICLE_COLUMN_NAMES], the layout saved to projects
+        return [self.value(id, name) for name in VEHICLE_COLUMN_NAMES]
+
+    def status_code(self, status):
+        return self.categories["status"].codes.get(status, -1)
+
+    def ordering(self, key):
+        ordering = self.orderings.get(key)
+        if ordering is None:
+            order = np.lexsort((self.ids(), self.column(key)))
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            codes = self.column('status')[order]
+            masks = {code: codes == code for code in range(len(self.categories["status"].values))}
+            ordering = self.orderings[key] = (order, rank, masks)
+        return ordering
+
+    def next_id(self, after=None, status=None, exclude_status=None, key='id', backwards=False):
+        # Next (or previous) vehicle in the order of the key column after the given one, wrapping around,
+        # with / without the status; None if there is none. Looks only at the status mask, no Python loop.
+        order, rank, masks = self.ordering(key)
+        if status is not None:
+            mask = masks.get(self.status_code(status))
+            if mask is None:
+                return None
+        elif exclude_status is not None:
+            excluded = masks.get(self.status_code(exclude_status))
+            mask = ~excluded if excluded is not None else np.ones(len(order), dtype=bool)
+        else:
+            mask = np.ones(len(order), dtype=bool)
+
+        start = rank[self.index[after]] if after in self.index else -1
+        if backwards:
+            mask = mask[::-1]
+            start = len(order) - 1 - start if after in self.index else -1
+        position = first_set(mask[start + 1:])
+        if position is not None:
+            position += start + 1
+        else:
+            position = first_set(mask[:start + 1])
+            if position is None:
+                return None
+        if backwards:
+            position = len(order) - 1 - position
+        return int(self.rows['id'][order[position]])
+
+    def next_ids(self, after, count, status, key='id'):
+        # up to count vehicles with the status following the given one in the order of the key column (wrapping around)
+        order, rank, masks = self.ordering(key)
+        mask = masks.get(self.status_code(status))
+        if mask is None:
+            return []
+        start = rank[self.index[after]] + 1 if after in self.index else 0
+        positions = np.concatenate((np.flatnonzero(mask[start:]) + start, np.flatnonzero(mask[:start])))
+        ids = self.rows['id'][order[positions[:count + 1]]].tolist()
+        return [id for id in ids if id != after][:count]
+
+    def status_codes_of(self, ids):
+        # status codes for an array of vehicle ids, -1 for ids that are not in the table
+        ids = np.asarray(ids)
+        if self.count == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        order = self.ordering('id')[0]
+        sorted_ids = self.ids()[order]
+        positions = np.minimum(np.searchsorted(sorted_ids, ids), self.count - 1)
+        found = sorted_ids[positions] == ids
+        return np.where(found, self.column('status')[order[positions]], -1)
+
+    def count_by_status(self):
+        return {status: int(count) for status, count in zip(self.categories["status"].values, self.status_counts)}
+
+    def in_bounds(self, south, west, north, east):
+        lat, lon = self.column('lat'), self.column('lon')
+        inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return self.ids()[inside]
+
+    def positioned(self):
+        # (ids, lat, lon, status codes) of vehicles with a position (not 0, 0)
+        lat, lon = self.column('lat'), self.column('lon')
+        has_position = (lat != 0) | (lon != 0)
+        return self.ids()[has_position], lat[has_position], lon[has_position], self.column('status')[has_position]
+
+
+def first_set(mask):
+    # index of the first True, None if there is none
+    if len(mask) == 0:
+        return None
+    i = int(np.argmax(mask))
+    return i if mask[i] else None
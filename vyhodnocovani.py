@@ -1,3 +1,4 @@
+import json
 import math
 import sys
 import random
@@ -9,12 +10,33 @@ from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage  # install Q
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QPushButton, QWidget, QFileDialog
 from PyQt5.QtCore import QUrl, QRect, QTimer, pyqtSlot, QObject, Qt
 import folium
+import numpy as np
 
 from mainwindow import Ui_MainWindow  # Import the generated UI class
 from custom_video_widget import CustomVideoWidget  # Import the custom video widget class
+from camera_track import CameraTrack
+from route_lod import RouteLevels, DETAIL_ZOOM
+from project_db import ProjectDatabase, open_project
+from change_journal import ChangeJournal
+from autosave import AutosaveWorker
+from vehicle_table import VehicleTable, STATUSES, OUTPUT_COLUMNS
 
 USE_MAPY_CZ = True     # True znamená využití dlaždic z Mapy.cz -> stojí to kredity, False znamená žádné dlaždice
 
+# kódy stavů vozidel posílané do mapy, musí odpovídat poli markerStatusNames v JavaScriptu
+MARKER_STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# marker kamery se v mapě aktualizuje nejvýše CAMERA_MARKER_MAX_FPS krát za sekundu
+# a jen když se posune alespoň o CAMERA_MARKER_MIN_PIXELS pixelů nebo otočí o CAMERA_MARKER_MIN_ANGLE stupňů
+CAMERA_MARKER_MAX_FPS = 10
+CAMERA_MARKER_MIN_PIXELS = 1.0
+CAMERA_MARKER_MIN_ANGLE = 2.0
+
+# při práci na vozidle se předem dekódují první snímky tolika dalších nehotových vozidel
+PREFETCH_VEHICLES = 3
+
+FINAL_OUTPUT_PATH = "D:/bakalarka/PyCharm/bakalarka_ui/programy_parkovani/final_output.txt"
+
 
 class WebEnginePage(QWebEnginePage):
     def javaScriptConsoleMessage(self, level, message, lineNumber, sourceID):
@@ -43,20 +65,41 @@ class MainApp(QMainWindow, Ui_MainWindow):
         self.video_widget = CustomVideoWidget(max_width=max_width, max_height=max_height, labels_dir="D:/bakalarka/PyCharm/bakalarka_ui/programy_parkovani/labels")
         self.videoLayout.addWidget(self.video_widget)
 
-        self.prev_angle = 0
-        self.camera_gps_coordinates = []
+        self.camera_track = CameraTrack.from_points([])
+        self.route = RouteLevels([])
+
+        # aktualizace markeru kamery se slučují, posílá se jen poslední snímek
+        self.camera_marker_frame = None
+        self.camera_marker_sent = None  # (lat, lng, angle) naposledy poslané do mapy
+        self.camera_marker_timer = QTimer(self)
+        self.camera_marker_timer.setSingleShot(True)
+        self.camera_marker_timer.setInterval(int(1000 / CAMERA_MARKER_MAX_FPS))
+        self.camera_marker_timer.timeout.connect(self.flush_camera_marker)
         self.video_widget.set_frame_update_callback(self.update_camera_marker)
         self.video_widget.set_bounding_box_callback(self.bounding_box_clicked)
 
         self.zpet_na_zacatek.clicked.connect(self.video_widget.seek_video(1))
         self.prehrat.clicked.connect(self.video_widget.pause_unpause)
+        # rychlost přehrávání 0.25× až 8×
+        self.skip_dozadu.clicked.connect(lambda: self.zmenit_rychlost(-1))
+        self.skip_dopredu.clicked.connect(lambda: self.zmenit_rychlost(1))
 
-        # {id: [kategorie_vozidla, lat, lon, status, cas_ve_videu, cas_realny,
+        # sloupce kategorie_vozidla, lat, lon, status, cas_ve_videu, cas_realny,
         # typ_parkoviste, oznaceni_parkoviste, typ_povrchu, vztah_k_provozu, legalnost_parkovani, vrak,
-        # komentar, validovano, komentar_validace]}
-        self.vehicles = {}
+        # komentar, validovano, komentar_validace (viz vehicle_table.py)
+        self.vehicles = VehicleTable()
+        self.projekt = None
+
+        # změny vozidel se připisují do final_output.txt.journal, celý final_output.txt se přepisuje jen občas
+        self.journal = ChangeJournal(FINAL_OUTPUT_PATH)
+        # ukládání běží na pozadí, tlačítka jen oznámí změněné vozidlo
+        self.autosave = AutosaveWorker(self.journal)
+        self.autosave.start()
 
         self.zrusit_vozidlo_button.clicked.connect(self.zrusit_vozidlo)
+        # se Shiftem skočí na předchozí nehotové vozidlo
+        self.skocit_na_nehotove.clicked.connect(self.skocit_na_nehotove_vozidlo)
+        self.ulozit_a_dalsi_button.clicked.connect(self.ulozit_a_dalsi)
 
         # -------------------- MAPA --------------------
 
@@ -64,6 +107,14 @@ class MainApp(QMainWindow, Ui_MainWindow):
         self.gps_text.setCursor(QCursor(Qt.PointingHandCursor))
         self.gps_text.mousePressEvent = self.open_external_map
 
+        # střed mapy z JavaScriptu, do gps_text se propisuje časovačem (při rychlém posunu jen poslední hodnota)
+        self.map_center = None
+        self.map_zoom = 19
+        self.map_center_timer = QTimer(self)
+        self.map_center_timer.setSingleShot(True)
+        self.map_center_timer.setInterval(16)
+        self.map_center_timer.timeout.connect(self.show_map_center)
+
         # vytvoření widgetu pro mapu
         self.webview = QWebEngineView()
         self.webview.setPage(WebEnginePage(self.webview))
@@ -75,7 +126,7 @@ class MainApp(QMainWindow, Ui_MainWindow):
         self.webview.page().setWebChannel(channel)
 
         # vytvoření mapy (defaultní souřadnice na ČVUT v Děčíně)
-        self.m = folium.Map(location=[50.7789992, 14.2160289], zoom_start=19, max_zoom=19, min_zoom=16, scrollWheelZoom=False, tiles=None)
+        self.m = folium.Map(location=[50.7789992, 14.2160289], zoom_start=19, max_zoom=19, min_zoom=16, scrollWheelZoom=False, tiles=None, prefer_canvas=True)
 
         # čtení api klíče pro Mapy.cz
         if USE_MAPY_CZ:
@@ -140,25 +191,204 @@ class MainApp(QMainWindow, Ui_MainWindow):
         script = """
             let markers = [];
             var polyline = null;
+            var polylineDetail = null;
+            var routeLevels = null;
+            var routeDetailZoom = 19;
             var cameraMarker = null;
             
             var bridge = null;
             new QWebChannel(qt.webChannelTransport, function (channel) {
                     bridge = channel.objects.bridge;
+                    drawRouteLevel();  // the route may have been set before the channel was ready
                 });
             
-            // Add a marker to the map
-            function addMarker(id, lat, lng) {
+            var markerStatusNames = ['tbd', 'done', 'disabled'];
+            var markerStyles = {
+                'tbd': {color: 'red', fillColor: 'red', fillOpacity: 0.4},
+                'done': {color: 'green', fillColor: 'green', fillOpacity: 0.6},
+                'disabled': {color: 'lightgray', fillColor: 'lightgray', fillOpacity: 0.2}
+            };
+            var selectedMarkerStyle = {color: 'orange', fillColor: 'orange', fillOpacity: 0.9};
+            var markerStatus = {};
+            var selectedMarkerId = null;
+            // true from the start of a drag of the map by the user until the map stops (inertia included),
+            // only then does the selected marker follow the map centre; setView, zoom etc. never move it
+            var userDrag = false;
+            
+            // Vehicles are drawn on a canvas and only the ones in view are on the map. Below
+            // clusterBelowZoom nearby vehicles are merged into one circle per clusterCellSize pixels.
+            var markerIds = [];
+            var clusterBelowZoom = 18;
+            var clusterCellSize = 60;
+            var vehicleRenderer = null;
+            var vehicleLayer = null;
+            var clusterLayer = null;
+            var shownMarkers = new Set();
+            
+            // Add a marker to the vehicle layer (it is shown by refreshVehicleLayer)
+            function addMarker(id, lat, lng, status) {
+                let style = markerStyles[status] || markerStyles['tbd'];
                 let marker = L.circleMarker([lat, lng], {
+                    renderer: vehicleRenderer,
                     radius: 8,
-                    color: 'red',
-                    fillColor: 'red',
-                    fillOpacity: 0.5
-                }).addTo(map);
+                    color: style.color,
+                    fillColor: style.fillColor,
+                    fillOpacity: style.fillOpacity
+                });
                 marker.on('click', function() {
                     bridge.onMarkerClicked(id);
                 });
+                if (!markers[id]) {
+                    markerIds.push(id);
+                }
                 markers[id] = marker;
+                markerStatus[id] = status;
+            }
+            
+            function showMarker(id, visible) {
+                if (visible) {
+                    visible.add(id);
+                    if (!shownMarkers.has(id)) {
+                        vehicleLayer.addLayer(markers[id]);
+                    }
+                } else if (shownMarkers.has(id)) {
+                    vehicleLayer.removeLayer(markers[id]);
+                }
+            }
+            
+            function clusterColor(counts) {
+                if (counts['tbd']) {
+                    return markerStyles['tbd'];
+                }
+                return counts['done'] ? markerStyles['done'] : markerStyles['disabled'];
+            }
+            
+            // Rebuild what is visible after the map moved or markers changed
+            function refreshVehicleLayer() {
+                let bounds = map.getBounds().pad(0.2);
+                let zoom = map.getZoom();
+                let visible = new Set();
+                clusterLayer.clearLayers();
+            
+                if (zoom >= clusterBelowZoom) {
+                    for (let id of markerIds) {
+                        if (id === selectedMarkerId || bounds.contains(markers[id].getLatLng())) {
+                            showMarker(id, visible);
+                        }
+                    }
+                } else {
+                    let cells = {};
+                    for (let id of markerIds) {
+                        let latLng = markers[id].getLatLng();
+                        if (id === selectedMarkerId) {
+                            showMarker(id, visible);
+                            continue;
+                        }
+                        if (!bounds.contains(latLng)) {
+                            continue;
+                        }
+                        let point = map.project(latLng, zoom);
+                        let key = Math.floor(point.x / clusterCellSize) + ':' + Math.floor(point.y / clusterCellSize);
+                        let cell = cells[key];
+                        if (!cell) {
+                            cell = cells[key] = {ids: [], lat: 0, lng: 0, counts: {}};
+                        }
+                        let status = markerStatus[id] || 'tbd';
+                        cell.ids.push(id);
+                        cell.lat += latLng.lat;
+                        cell.lng += latLng.lng;
+                        cell.counts[status] = (cell.counts[status] || 0) + 1;
+                    }
+                    for (let key in cells) {
+                        let cell = cells[key];
+                        if (cell.ids.length === 1) {
+                            showMarker(cell.ids[0], visible);
+                            continue;
+                        }
+                        let center = [cell.lat / cell.ids.length, cell.lng / cell.ids.length];
+                        let style = clusterColor(cell.counts);
+                        let cluster = L.circleMarker(center, {
+                            renderer: vehicleRenderer,
+                            radius: Math.min(30, 8 + 2 * Math.sqrt(cell.ids.length)),
+                            color: style.color,
+                            fillColor: style.fillColor,
+                            fillOpacity: Math.max(style.fillOpacity, 0.4)
+                        });
+                        cluster.bindTooltip(String(cell.ids.length));
+                        cluster.on('click', function() {
+                            map.setView(center, clusterBelowZoom);
+                        });
+                        clusterLayer.addLayer(cluster);
+                    }
+                }
+            
+                for (let id of shownMarkers) {
+                    if (!visible.has(id)) {
+                        showMarker(id, null);
+                    }
+                }
+                shownMarkers = visible;
+            }
+            
+            // Restyle a single marker according to its status and the current selection
+            function styleMarker(id) {
+                let marker = markers[id];
+                if (!marker) {
+                    return;
+                }
+                if (id === selectedMarkerId) {
+                    marker.setStyle(selectedMarkerStyle);
+                } else {
+                    marker.setStyle(markerStyles[markerStatus[id]] || markerStyles['tbd']);
+                }
+            }
+            
+            function setMarkerStatus(id, status) {
+                markerStatus[id] = status;
+                styleMarker(id);
+                if (map.getZoom() < clusterBelowZoom) {
+                    refreshVehicleLayer();  // cluster colours depend on the statuses
+                }
+            }
+            
+            // Only the previously selected and the newly selected marker change their style
+            function selectMarker(id) {
+                let previousId = selectedMarkerId;
+                selectedMarkerId = id;
+                if (previousId !== null && previousId !== id) {
+                    styleMarker(previousId);
+                }
+                if (!markers[id]) {
+                    console.log('Marker with ID ' + id + ' not found');
+                    return;
+                }
+                styleMarker(id);
+                // the selected marker is shown even outside the view or in a cluster, the rest of the layer
+                // is refreshed by the moveend of setView
+                if (!shownMarkers.has(id)) {
+                    vehicleLayer.addLayer(markers[id]);
+                    shownMarkers.add(id);
+                }
+                userDrag = false;
+                map.setView(markers[id].getLatLng(), map.getZoom());
+            }
+            
+            // Add all markers in one call, data = [id, lat, lng, statusCode, id, lat, lng, statusCode, ...]
+            function addMarkers(data) {
+                for (let i = 0; i < data.length; i += 4) {
+                    addMarker(data[i], data[i + 1], data[i + 2], markerStatusNames[data[i + 3]]);
+                }
+                refreshVehicleLayer();
+                console.log('Added ' + data.length / 4 + ' markers');
+            }
+            
+            // [lat, lng, lat, lng, ...] -> [[lat, lng], ...]
+            function toLatLngs(flat) {
+                let latLngs = new Array(flat.length / 2);
+                for (let i = 0; i < latLngs.length; i++) {
+                    latLngs[i] = [flat[2 * i], flat[2 * i + 1]];
+                }
+                return latLngs;
             }
             
             // Draw polyline between points
@@ -169,6 +399,47 @@ class MainApp(QMainWindow, Ui_MainWindow):
                 polyline = L.polyline(coords, {color: 'blue'}).addTo(map);
             }
             
+            // Route simplified for every zoom level, levels = {zoom: [lat, lng, lat, lng, ...]}
+            function setRoute(levels, detailZoom) {
+                routeLevels = levels;
+                routeDetailZoom = detailZoom;
+                drawRouteLevel();
+            }
+            
+            function drawRouteLevel() {
+                if (!routeLevels) {
+                    return;
+                }
+                let zoom = map.getZoom();
+                // the most detailed level not above the current zoom, or the coarsest one
+                let zooms = Object.keys(routeLevels).map(Number).sort(function(a, b) { return a - b; });
+                let levelZoom = zooms.length ? zooms[0] : null;
+                for (let z of zooms) {
+                    if (z <= zoom) {
+                        levelZoom = z;
+                    }
+                }
+                if (levelZoom !== null && (!polyline || polyline.routeZoom !== levelZoom)) {
+                    drawPolyline(toLatLngs(routeLevels[levelZoom]));
+                    polyline.routeZoom = levelZoom;
+                }
+                if (zoom >= routeDetailZoom && bridge) {
+                    let bounds = map.getBounds().pad(0.5);
+                    bridge.requestRouteDetail(bounds.getSouth(), bounds.getWest(), bounds.getNorth(), bounds.getEast());
+                } else if (polylineDetail) {
+                    map.removeLayer(polylineDetail);
+                    polylineDetail = null;
+                }
+            }
+            
+            // Full resolution parts of the route around the viewport, parts = [[lat, lng, ...], ...]
+            function drawRouteDetail(parts) {
+                if (polylineDetail) {
+                    map.removeLayer(polylineDetail);
+                }
+                polylineDetail = L.polyline(parts.map(toLatLngs), {color: 'blue'}).addTo(map);
+            }
+            
             // Update GPS marker position
             function updateCameraMarker(lat, lng, angle) {
                 if (cameraMarker) {
@@ -193,15 +464,40 @@ class MainApp(QMainWindow, Ui_MainWindow):
             var mapElementId = document.getElementsByClassName('folium-map')[0].id;
             var map = window[mapElementId];
             
+            vehicleRenderer = L.canvas({padding: 0.5});
+            vehicleLayer = L.layerGroup().addTo(map);
+            clusterLayer = L.layerGroup().addTo(map);
+            map.on('moveend', refreshVehicleLayer);
+            map.on('moveend', drawRouteLevel);
+            
             // Attach event listeners to continuously update marker position while moving the map
-            map.on('movestart', function() {
-                var center = map.getCenter();
-                bridge.onMapMoving(center.lat, center.lng);
+            // The selected marker follows the map centre here in JavaScript, Python gets the centre
+            // at most once per animation frame and the final position on moveend.
+            var moveFramePending = false;
+            
+            map.on('dragstart', function() {
+                userDrag = true;
             });
             
             map.on('move', function() {
                 var center = map.getCenter();
-                bridge.onMapMoving(center.lat, center.lng);
+                if (userDrag && selectedMarkerId !== null && markers[selectedMarkerId]) {
+                    markers[selectedMarkerId].setLatLng(center);
+                }
+                if (!moveFramePending) {
+                    moveFramePending = true;
+                    window.requestAnimationFrame(function() {
+                        moveFramePending = false;
+                        var center = map.getCenter();
+                        bridge.onMapMoving(center.lat, center.lng);
+                    });
+                }
+            });
+            
+            map.on('moveend', function() {
+                var center = map.getCenter();
+                bridge.onMapMoved(center.lat, center.lng, map.getZoom(), userDrag);
+                userDrag = false;
             });
             
             console.log('Map events setup successfully');
@@ -211,41 +507,69 @@ class MainApp(QMainWindow, Ui_MainWindow):
 
     @pyqtSlot(float, float)
     def onMapMoving(self, lat, lng):
+        # během posunu mapy se zobrazí jen poslední poloha středu, nejvýše jednou za snímek
+        self.map_center = (lat, lng)
+        if not self.map_center_timer.isActive():
+            self.map_center_timer.start()
+
+    @pyqtSlot(float, float, int, bool)
+    def onMapMoved(self, lat, lng, zoom, user_move):
+        self.map_center = (lat, lng)
+        self.map_zoom = zoom
+        self.show_map_center()
+        # posunem mapy uživatel přesouvá vybrané vozidlo, marker už posunul JavaScript
+        id = self.video_widget.selected_vehicle_id
+        if user_move and id in self.vehicles:
+            self.vehicles.set(id, lat=lat, lon=lng)
+            self.save_vehicle(id, lat=lat, lon=lng)
+
+    def show_map_center(self):
+        self.map_center_timer.stop()
+        lat, lng = self.map_center
         self.gps_text.setText(f"{lat}, {lng}")
-        script = f"""
-                var marker = markers[{self.video_widget.selected_vehicle_id}];
-                if (marker) {{
-                    marker.setLatLng([%s, %s]);
-                }}
-                """ % (lat, lng)
-        self.webview.page().runJavaScript(script)
 
     def draw_polyline_from_file(self, filepath):
-        gps = []
-        with open(filepath, 'r') as file:
-            for line in file:
-                lat, lng = map(float, line.strip().split(','))
-                gps.append([lat, lng])
-        script = f"drawPolyline({gps})"
-        self.webview.page().runJavaScript(script)
+        gps = np.loadtxt(filepath, delimiter=',', ndmin=2)
+        self.draw_route(gps)
+
+    def draw_route(self, points):
+        # cesta se zjednoduší jednou pro každé přiblížení, plné rozlišení se posílá jen pro výřez mapy
+        self.route = RouteLevels(points)
+        levels = json.dumps(self.route.level_arrays(), separators=(',', ':'))
+        self.webview.page().runJavaScript(f"setRoute({levels}, {DETAIL_ZOOM})")
+
+    @pyqtSlot(float, float, float, float)
+    def requestRouteDetail(self, south, west, north, east):
+        parts = json.dumps(self.route.detail_in_bounds(south, west, north, east), separators=(',', ':'))
+        self.webview.page().runJavaScript(f"drawRouteDetail({parts})")
 
     def update_camera_marker(self, frame_index):
-        if frame_index < len(self.camera_gps_coordinates):
-            lat, lng = self.camera_gps_coordinates[frame_index]
-            if frame_index > 0:
-                prev_lat, prev_lng = self.camera_gps_coordinates[frame_index - 1]
-                angle = self.calculate_angle(prev_lat, prev_lng, lat, lng)
-            else:
-                angle = 0
-            script = f"updateCameraMarker({lat}, {lng}, {angle})"
-            self.webview.page().runJavaScript(script)
-
-    def calculate_angle(self, lat1, lng1, lat2, lng2):
-        if lat1 == lat2 and lng1 == lng2:
-            return self.prev_angle
-        angle = math.degrees(math.atan2(lng2 - lng1, lat2 - lat1))
-        self.prev_angle = angle
-        return angle
+        # volá se pro každý snímek videa, do mapy se ale posílá jen časovačem
+        self.camera_marker_frame = frame_index
+        if not self.camera_marker_timer.isActive():
+            self.camera_marker_timer.start()
+
+    def flush_camera_marker(self):
+        frame_index = self.camera_marker_frame
+        if frame_index is None or frame_index >= len(self.camera_track) or not self.webview.isVisible():
+            return
+        lat, lng = self.camera_track.position(frame_index)
+        angle = float(self.camera_track.smoothed_heading[frame_index])
+        if self.camera_marker_sent is not None:
+            sent_lat, sent_lng, sent_angle = self.camera_marker_sent
+            angle_change = abs((angle - sent_angle + 180) % 360 - 180)
+            if self.distance_in_pixels(sent_lat, sent_lng, lat, lng) < CAMERA_MARKER_MIN_PIXELS and angle_change < CAMERA_MARKER_MIN_ANGLE:
+                return
+        self.camera_marker_sent = (lat, lng, angle)
+        script = f"updateCameraMarker({lat}, {lng}, {angle})"
+        self.webview.page().runJavaScript(script)
+
+    def distance_in_pixels(self, lat1, lng1, lat2, lng2):
+        # vzdálenost na obrazovce při aktuálním přiblížení mapy (Web Mercator, 256px dlaždice)
+        meters_per_pixel = 156543.03392 * math.cos(math.radians(lat1)) / 2 ** self.map_zoom
+        dx = math.radians(lng2 - lng1) * math.cos(math.radians(lat1)) * 6378137
+        dy = math.radians(lat2 - lat1) * 6378137
+        return math.hypot(dx, dy) / meters_per_pixel
 
     def open_external_map(self, event):
         # GPS coordinates
@@ -265,56 +589,16 @@ class MainApp(QMainWindow, Ui_MainWindow):
     @pyqtSlot(int)
     def onMarkerClicked(self, id):
         self.bounding_box_clicked(id)  # na konci volá select_marker
-        self.video_widget.seek_video(self.video_widget.highlighted_frames[0])
+        if len(self.video_widget.highlighted_frames):
+            self.video_widget.seek_video(int(self.video_widget.highlighted_frames[0]))
 
     def select_marker(self, id):
-        set_styles_script = ""
-        for key, data in self.vehicles.items():
-            vehicle_status = data[3]
-            set_styles_script += f"""
-                if (markers[{key}]) {{
-                    if ('{vehicle_status}' === "done") {{
-                        markers[{key}].setStyle({{
-                            color: 'green',
-                            fillColor: 'green',
-                            fillOpacity: 0.6
-                        }});
-                    }}
-                    if ('{vehicle_status}' === "disabled") {{
-                        markers[{key}].setStyle({{
-                            color: 'lightgray',
-                            fillColor: 'lightgray',
-                            fillOpacity: 0.2
-                        }});
-                    }}
-                }}
-            """
+        # mapa si stavy markerů pamatuje sama, stačí poslat nový výběr
+        self.webview.page().runJavaScript(f"selectMarker({id})")
 
-        script = f"""
-            for (var i = 0; i < markers.length; i++) {{
-                if (markers[i]) {{
-                    markers[i].setStyle({{
-                        color: 'red',
-                        fillColor: 'red',
-                        fillOpacity: 0.4
-                    }});
-                }}
-            }}
-            {set_styles_script}
-            if (markers[{id}]) {{
-                markers[{id}].setStyle({{
-                    color: 'orange',
-                    fillColor: 'orange',
-                    fillOpacity: 0.9
-                }});
-            }} else {{
-                console.log('Marker with ID ' + {id} + ' not found');
-            }}
-            var mapElementId = document.getElementsByClassName('folium-map')[0].id;
-            var map = window[mapElementId];
-            map.setView(markers[{id}].getLatLng(), map.getZoom());
-        """
-        self.webview.page().runJavaScript(script)
+    def set_marker_status(self, id):
+        status = self.vehicles.status(id)
+        self.webview.page().runJavaScript(f"setMarkerStatus({id}, {json.dumps(status)})")
 
     def bind_marker_to_move(self, id):
         script = f"""
@@ -329,144 +613,167 @@ class MainApp(QMainWindow, Ui_MainWindow):
 
     # -------------------- VIDEO --------------------
 
-    def open_video_project(self, nazev_projektu, popis_projektu, slozka_projektu, nazev_videa, nastaveni, camera_gps_points, camera_gps_track):
-        # načtení videa
-        self.video_widget.load_video(slozka_projektu + "/" + nazev_videa)
+    def open_video_project(self, projekt):
+        # načtení videa, přehrává se zmenšená proxy ze složky projektu (při prvním otevření se vytváří na pozadí)
+        self.video_widget.load_video(projekt.folder + "/" + projekt.video_name, proxy_dir=projekt.folder + "/.proxy")
 
         # ----- TODO: nastaveni -----
 
         # vykreslení cesty kamery
-        script = f"drawPolyline({camera_gps_points})"
-        self.webview.page().runJavaScript(script)
+        self.draw_route(projekt.camera_points())
 
-        # načtení všech bodů kamery
-        for point in camera_gps_track:
-            self.camera_gps_coordinates.append(point)
+        # cesta kamery pro každý snímek se načte až po zobrazení prvního snímku
+        self.camera_track = CameraTrack.from_points([])
+        self.camera_marker_sent = None
+        QTimer.singleShot(0, lambda: self.load_camera_track(projekt))
 
         # načtení hotových vozidel
-        with open("D:/bakalarka/PyCharm/bakalarka_ui/programy_parkovani/final_output.txt", 'r') as file:
-            for line in file:
-                parts = line.strip().split()
-                id = int(parts[0])
-                type = parts[1]
-                lat = float(parts[2])
-                lon = float(parts[3])
-                status = parts[4]
-                self.vehicles[id] = [type, lat, lon, status]
-
-        for id, data in self.vehicles.items():
-            if data[0] != 0 or data[1] != 0:
-                script = f"addMarker({id}, {data[1]}, {data[2]})"
-                self.webview.page().runJavaScript(script)
-
-        first_id_tbd = None
-        for id, data in self.vehicles.items():
-            if data[3] == "tbd":
-                first_id_tbd = id
-                break
-        if first_id_tbd is not None:
-            self.bounding_box_clicked(first_id_tbd)
+        # (včetně změn z journalu, které se do final_output.txt ještě nezapsaly)
+        if not self.autosave.flush():
+            print(f"Neuložené změny se nepodařilo zapsat, ukládání se zopakuje: {self.autosave.stats()['last_error']}")
+        self.vehicles.update_many(self.journal.load(), OUTPUT_COLUMNS)
+
+        # všechny markery vozidel s polohou se do mapy pošlou jedním voláním
+        ids, lat, lon, codes = self.vehicles.positioned()
+        codes = np.where(codes < len(STATUSES), codes, MARKER_STATUS_CODES["tbd"])
+        markers_data = [value for marker in zip(ids.tolist(), lat.tolist(), lon.tolist(), codes.tolist()) for value in marker]
+        script = f"addMarkers({json.dumps(markers_data, separators=(',', ':'))})"
+        self.webview.page().runJavaScript(script)
+
+        self.update_progress()
+        self.update_timeline_statuses()
+
+        first_id = self.vehicles.next_id(status="tbd")
+        if first_id is None:
+            first_id = self.vehicles.next_id(exclude_status="not_detected")
+        if first_id is not None:
+            self.bounding_box_clicked(first_id)
+
+    def load_camera_track(self, projekt):
+        # směr a rychlost pro každý snímek se spočítají najednou, výsledek se ukládá vedle projektu
+        # (při platné cache se sekce "Cesta Kamery" vůbec nečte)
+        if isinstance(projekt, ProjectDatabase):
+            # v databázi je cesta uložená binárně, načtení je rychlé i bez cache
+            self.camera_track = CameraTrack.from_points(projekt.camera_track(), self.video_widget.fps)
         else:
-            for id, data in self.vehicles.items():
-                if data[3] != "not_detected":
-                    self.bounding_box_clicked(id)
-                    break
+            self.camera_track = CameraTrack.load_or_compute(f"{projekt.path}.track.npz", projekt.path,
+                                                            projekt.camera_track, self.video_widget.fps)
+        self.camera_marker_sent = None
 
     def bounding_box_clicked(self, id):
         print(f"Bounding box {id} clicked.")
-        frames = []
-        with open(f"D:/bakalarka/PyCharm/bakalarka_ui/programy_parkovani/labels/{id}.txt", 'r') as file:
-            for line in file:
-                parts = line.strip().split()
-                frame = int(parts[0])
-                frames.append(frame)
-        self.video_widget.selected_vehicle_id = id
+        # snímky vozidla z indexu štítků načteného s videem (bez čtení labels/{id}.txt)
+        frames = self.video_widget.get_vehicle_frames(id)
+        self.video_widget.select_vehicle(id)
         self.video_widget.set_highlighted_frames(frames)
         self.select_marker(id)
 
-        if self.vehicles[id][3] == "disabled":
+        if self.vehicles.status(id) == "disabled":
             self.zrusit_vozidlo_button.setText("Obnovit\nvozidlo")
         else:
             self.zrusit_vozidlo_button.setText("Zrušit\nvozidlo")
 
+        self.prefetch_next_vehicles(id)
+
+    def go_to_vehicle(self, id):
+        # výběr vozidla a přesun videa na jeho první snímek
+        self.bounding_box_clicked(id)
+        frames = self.video_widget.highlighted_frames
+        if len(frames):
+            self.video_widget.seek_video(int(frames[0]))
+
+    def prefetch_next_vehicles(self, id):
+        # první snímky dalších nehotových vozidel se dekódují na pozadí, přechod na ně pak nečeká na seek
+        next_ids = self.vehicles.next_ids(id, PREFETCH_VEHICLES, "tbd", key="cas_ve_videu")
+        positions = []
+        for next_id in next_ids:
+            frames = self.video_widget.get_vehicle_frames(next_id)
+            if len(frames):
+                positions.append(int(frames[0]))
+        self.video_widget.prefetch_frames(positions)
+
     # -------------------- MENU --------------------
 
     def open_vyhodnocovani(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Otevřít soubor", "", "Konfigurační soubor parkování (*.pconf.txt)")
+        file_path, _ = QFileDialog.getOpenFileName(self, "Otevřít soubor", "", "Konfigurační soubor parkování (*.pconf.txt *.pconf.db)")
         if file_path:
             print(f"Otevřen soubor: {file_path}")
-            slozka_projektu = "/".join(file_path.split("/")[:-1])
-            camera_gps_points = []
-            camera_gps_track = []
-            next_lines = ""
-            with open(file_path, 'r') as file:
-                nazev_projektu = file.readline().strip()
-                popis_projektu = file.readline().strip()
-                video_name = file.readline().strip()
-                for line in file:
-                    if line.startswith("*KONEC"):
-                        next_lines = ""
-                    elif line.startswith(">--- Nastaveni"):
-                        next_lines = "Nastaveni"
-                        continue  # TODO: načíst nastavení
-                    elif line.startswith(">--- Body Kamery"):
-                        next_lines = "Body Kamery"
-                    elif line.startswith(">--- Cesta Kamery"):
-                        next_lines = "Cesta Kamery"
-                    elif line.startswith(">--- Detekce Objektu"):
-                        next_lines = "Detekce Objektu"
-
-                    if next_lines == "Nastaveni":
-                        continue  # TODO: načíst nastavení
-                    elif next_lines == "Body Kamery":
-                        parts = line.strip().split()
-                        lat = float(parts[0])
-                        lon = float(parts[1])
-                        camera_gps_points.append([lat, lon])
-                    elif next_lines == "Cesta Kamery":
-                        parts = line.strip().split()
-                        lat = float(parts[0])
-                        lon = float(parts[1])
-                        camera_gps_track.append([lat, lon])
-                    elif next_lines == "Detekce Objektu":
-                        parts = line.strip().split()
-                        id = int(parts[0])
-                        kategorie_vozidla = int(parts[1])
-                        lat = float(parts[2])
-                        lon = float(parts[3])
-                        status = parts[4]
-                        cas_ve_videu = int(parts[5])
-                        cas_realny = int(parts[6])
-                        typ_parkoviste = int(parts[7])
-                        oznaceni_parkoviste = int(parts[8])
-                        typ_povrchu = int(parts[9])
-                        vztah_k_provozu = int(parts[10])
-                        legalnost_parkovani = int(parts[11])
-                        vrak = int(parts[12])
-                        komentar = parts[13]
-                        validovano = parts[14]
-                        komentar_validace = parts[15]
-                        self.vehicles[id] = [kategorie_vozidla, lat, lon, status, cas_ve_videu, cas_realny,
-                                             typ_parkoviste, oznaceni_parkoviste, typ_povrchu, vztah_k_provozu, legalnost_parkovani, vrak,
-                                             komentar, validovano, komentar_validace]
-
-                self.open_video_project(nazev_projektu, popis_projektu, slozka_projektu, video_name, None, camera_gps_points, camera_gps_track)
+            # textový soubor se při otevření jen projde, sekce se načítají až když jsou potřeba
+            # (.pconf.db je binární projekt v SQLite, viz project_db.py)
+            projekt = open_project(file_path)
+            self.projekt = projekt
+            self.vehicles.update_many(projekt.vehicles())
+            self.autosave.set_project(file_path if isinstance(projekt, ProjectDatabase) else None)
+            self.open_video_project(projekt)
+
+    def save_vehicle(self, id, **values):
+        # uloží se na pozadí do journalu final_output.txt a v binárním projektu jen změněné sloupce vozidla
+        self.autosave.notify(id, self.vehicles.get(id), **values)
+        if "status" in values:
+            self.update_progress()
+            # na časové ose se přebarví jen detekce tohoto vozidla
+            self.video_widget.set_vehicle_status(id, MARKER_STATUS_CODES.get(values["status"], MARKER_STATUS_CODES["tbd"]))
+
+    def update_timeline_statuses(self):
+        # detekce na časové ose se barví podle stavu vozidla (neznámá vozidla a ostatní stavy jako "tbd")
+        codes = self.vehicles.status_codes_of(self.video_widget.label_store.boxes['vehicle_id'])
+        codes = np.where((codes >= 0) & (codes < len(STATUSES)), codes, MARKER_STATUS_CODES["tbd"])
+        self.video_widget.set_box_statuses(codes)
+
+    def update_progress(self):
+        # počty podle stavů udržuje tabulka vozidel, nic se neprochází
+        counts = self.vehicles.count_by_status()
+        total = len(self.vehicles) - counts.get("not_detected", 0) - counts.get("disabled", 0)
+        done = counts.get("done", 0)
+        percent = round(100 * done / total) if total else 0
+        self.hotovo_text.setText(f"{done}/{total}  ({percent}%)")
+
+    def closeEvent(self, event):
+        # zastavení dekódovacího vlákna videa
+        self.video_widget.release_video()
+        # dopsání neuložených změn a zapsání journalu do final_output.txt
+        self.autosave.stop()
+        self.journal.close()
+        print(f"Autosave: {self.autosave.stats()}")
+        print(f"Přehrávání: {self.video_widget.playback_stats()}")
+        super().closeEvent(event)
 
     # -------------------- TLACITKA --------------------
 
+    def skocit_na_nehotove_vozidlo(self):
+        # další nehotové vozidlo podle času ve videu (za vybraným vozidlem, na konci se začne znovu od začátku)
+        backwards = bool(QApplication.keyboardModifiers() & Qt.ShiftModifier)
+        id = self.vehicles.next_id(after=self.video_widget.selected_vehicle_id, status="tbd",
+                                   key="cas_ve_videu", backwards=backwards)
+        if id is not None:
+            self.go_to_vehicle(id)
+
+    def ulozit_a_dalsi(self):
+        # vybrané vozidlo je hotové, přechod na další nehotové podle času ve videu
+        id = self.video_widget.selected_vehicle_id
+        if id not in self.vehicles:
+            return
+        self.vehicles.set(id, status="done")
+        self.set_marker_status(id)
+        self.save_vehicle(id, status="done")
+        next_id = self.vehicles.next_id(after=id, status="tbd", key="cas_ve_videu")
+        if next_id is not None:
+            self.go_to_vehicle(next_id)
+
+    def zmenit_rychlost(self, steps):
+        speed = self.video_widget.change_playback_speed(steps)
+        self.statusbar.showMessage(f"Rychlost přehrávání: {speed:g}×")
+
     def zrusit_vozidlo(self):
         id = self.video_widget.selected_vehicle_id
-        if self.vehicles[id][3] == "disabled":
-            self.vehicles[id][3] = ""
+        if self.vehicles.status(id) == "disabled":
+            self.vehicles.set(id, status="")
             self.zrusit_vozidlo_button.setText("Zrušit\nvozidlo")
         else:
-            self.vehicles[id][3] = "disabled"
+            self.vehicles.set(id, status="disabled")
             self.zrusit_vozidlo_button.setText("Obnovit\nvozidlo")
-        self.select_marker(id)
-
-        with open("D:/bakalarka/PyCharm/bakalarka_ui/programy_parkovani/final_output.txt", 'w') as file:
-            for id, data in self.vehicles.items():
-                file.write(f"{id} {data[0]} {data[1]} {data[2]} {data[3]}\n")
+        self.set_marker_status(id)
+        self.save_vehicle(id, status=self.vehicles.status(id))
 
 
 if __name__ == "__main__":